@@ -1,119 +1,63 @@
+import time
+
+STARTED_AT = time.perf_counter()  # before the other imports, for the startup timings
+
+import argparse
+import asyncio
+import json
 import os
+import re
+import threading
 import traceback
-from datetime import datetime
 
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 from slack_bolt.app import App
 
 import config
 from utils.log import setup_logger
-from cluster.node import get_node_info_blocks, get_node_user_blocks, get_user_jobs_blocks
-from utils.slack2unix import get_slack2unix_map
-
-logger = setup_logger(output=config.LOGGER_OUTPUT, level=config.LOGGER_LEVEL)
-
-app = App(token=os.environ["SLACK_BOT_TOKEN"],
-          signing_secret=os.environ["SLACK_APP_TOKEN"],
-          logger=logger)
-
-
-def get_home_tab_blocks(user_id):
-    try:
-        unix_user = get_slack2unix_map().get(user_id, None)
-        blocks = [
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*Hi <@{user_id}>* :wave: ",
-                }
-            }, {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"Last updated: {datetime.now().strftime('%m/%d/%Y, %H:%M:%S')} \n"
-                },
-                "accessory": {
-                    "type": "button",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "Refresh",
-                        "emoji": True
-                    },
-                    "value": "refresh_home",
-                    "action_id": "action_refresh_home"
-                }
-            }, {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": "*GPU Cluster Summary:*",
-                }
-            }, *get_node_info_blocks()]
-
-        if unix_user:
-            blocks += [
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": "*User Summary:*",
-                    }
-                }, *get_node_user_blocks("All GPUs", limit=52),
-                *get_node_user_blocks("Non-preemptible GPUs", ignore_partition=["compute", "low-prio-gpu"], limit=12),
-                *get_node_user_blocks("`ddp-4way` GPUs", ignore_partition=["compute", "ddp-2way", "gpu", "low-prio-gpu"], limit=12),
-                *get_node_user_blocks("`ddp-2way` GPUs", ignore_partition=["compute", "ddp-4way",  "gpu", "low-prio-gpu"], limit=12),
-                *get_node_user_blocks("`gpu` GPUs", ignore_partition=["compute", "ddp-4way", "ddp-2way",  "low-prio-gpu"], limit=12),
-                *get_node_user_blocks("Preemptible GPUs", ignore_partition=["compute", "ddp-4way", "ddp-2way", "gpu"], limit=40),
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"*Your Jobs (`{unix_user}`):*\n",
-                    }
-                }, *get_user_jobs_blocks(unix_user, state='RUNNING')
-                , *get_user_jobs_blocks(unix_user, state='PENDING'),
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"*Waiting in Cluster:*\n",
-                    }
-                }, *get_user_jobs_blocks(unix_user_name=None, state='PENDING'),
-            ]
-        else:
-            blocks.extend(get_no_account_found_blocks())
-        blocks.extend([
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": " ",
-                },
-                "accessory": {
-                    "type": "button",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "Notes",
-                        "emoji": True
-                    },
-                    "value": "readme",
-                    "action_id": "action_readme",
-                }
-            }]
-        )
-        return blocks
-    except Exception:
-        logger.error(f"Failed to get home tab blocks")
-        traceback.print_exc()
-        return []
+from utils.metrics import HANDLER_ERRORS, HANDLER_SECONDS, PAYLOAD_BYTES, start_metrics_server, timed
+from cluster.collector import get_latest_snapshot, start_collector
+from cluster.history import start_cluster_histories
+from home import get_home_tab_blocks, command_cluster_stats, command_history, get_query_messages, get_readme_view, run_query
+from job_browser import job_browser
+from live_home import live_home_tabs
+from utils.persist import restore_state, start_autosave
+from utils.publisher import get_publish_queue
+from utils.slack2unix import get_slack2unix_map, update_slack_user
+from utils.startup import start_timer
+
+logger = setup_logger(output=config.LOGGER_OUTPUT, level=config.LOGGER_LEVEL, queue_size=config.LOGGER_QUEUE_SIZE,
+                      max_bytes=config.LOGGER_MAX_BYTES, when=config.LOGGER_ROTATE_WHEN,
+                      backup_count=config.LOGGER_BACKUP_COUNT, json_output=config.LOGGER_JSON)
+
+
+@timed(HANDLER_SECONDS, "refresh_home", errors=HANDLER_ERRORS)
+def refresh_home(ack, body):
+    user_id = body["user"]["id"]
+    ack()
+    live_home_tabs.touch(user_id)
+    get_publish_queue().submit(
+        user_id,
+        "views.update",
+        view_id=body["view"]["id"],
+        view={
+            "type": "home",
+            "blocks": get_home_tab_blocks(user_id)
+        }
+    )
 
 
-@app.action("action_refresh_home")
-def refresh_home(ack, body, client):
+@timed(HANDLER_SECONDS, "browse_jobs", errors=HANDLER_ERRORS)
+def browse_jobs(ack, body, action):
+    """Page buttons and filter/sort selects of the job lists, re-renders the home tab with the new page"""
     user_id = body["user"]["id"]
     ack()
-    client.views_update(
+    if not job_browser.handle_action(user_id, action):
+        return
+    live_home_tabs.touch(user_id)
+    get_publish_queue().submit(
+        user_id,
+        "views.update",
         view_id=body["view"]["id"],
         view={
             "type": "home",
@@ -122,14 +66,15 @@ def refresh_home(ack, body, client):
     )
 
 
-@app.event("app_home_opened")
-def update_home_tab(client, event, logger):
+@timed(HANDLER_SECONDS, "update_home_tab", errors=HANDLER_ERRORS)
+def update_home_tab(event, logger):
     try:
         user_id = event["user"]
-        # Call views.publish with the built-in client
-        client.views_publish(
-            # The user that opened your app's app home
-            user_id=user_id,
+        live_home_tabs.touch(user_id)
+        # Queue views.publish, sent by the publisher thread
+        get_publish_queue().submit(
+            user_id,
+            "views.publish",
             # The view object that appears in the app home
             view={
                 "type": "home",
@@ -141,55 +86,47 @@ def update_home_tab(client, event, logger):
         traceback.print_exc()
 
 
-def command_cluster_stats(user_id):
-    unix_user = get_slack2unix_map().get(user_id, None)
-    blocks = []
-    if unix_user:
-        return [{
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": f"*Hi <@{user_id}>* :wave:\nHere is the GPU availability summary ({datetime.now().strftime('%m/%d/%Y, %H:%M:%S')})",
-            }
-        }, *get_node_info_blocks()]
-    else:
-
-        return get_no_account_found_blocks()
+@timed(HANDLER_SECONDS, "update_slack2unix_map", errors=HANDLER_ERRORS)
+def update_slack2unix_map(event):
+    update_slack_user(event["user"])
 
 
-def get_no_account_found_blocks():
-    return [{
-        "type": "section",
-        "text": {
-            "type": "mrkdwn",
-            "text": f"*Error:*",
-        }
-    }, {
-        "type": "context",
-        "elements": [
-            {
-                "type": "mrkdwn",
-                "text": f"You do not seem to have a cluster account.\n"
-                        f"Reason: Cannot find any account matching your Slack full name (not display name) in tritons's `/etc/passwd` database.\n"
-                        f"Remedy: Run `getent passwd $USER` to look for your full name in triton and set the same on Slack."
-            }
-        ]
-    }]
+@timed(HANDLER_SECONDS, "scan_cluster", errors=HANDLER_ERRORS)
+def scan_cluster(ack, body):
+    blocks = command_cluster_stats(body["user_id"], body.get("text", ""))
+    PAYLOAD_BYTES.labels("cluster").observe(len(json.dumps(blocks)))
+    ack(blocks=blocks)
+
+
+@timed(HANDLER_SECONDS, "query", errors=HANDLER_ERRORS)
+def query(ack, body, respond):
+    """`/jobs` and `/nodes`, large answers are acknowledged first and sent through the response_url"""
+    kind = body["command"].lstrip("/")
+    result = run_query(body["user_id"], body.get("text", ""), kind)
+    if result is None or len(result[3]) <= config.QUERY_INLINE_MATCHES:
+        blocks = get_query_messages(result, kind)[0]
+        PAYLOAD_BYTES.labels(kind).observe(len(json.dumps(blocks)))
+        ack(blocks=blocks)
+        return
+    ack()
+    for blocks in get_query_messages(result, kind):
+        PAYLOAD_BYTES.labels(kind).observe(len(json.dumps(blocks)))
+        respond(blocks=blocks, response_type="ephemeral")
 
 
-@app.command("/cluster")
-def scan_cluster(ack, body):
-    ack(blocks=command_cluster_stats(body["user_id"]))
+@timed(HANDLER_SECONDS, "show_history", errors=HANDLER_ERRORS)
+def show_history(ack, body):
+    ack(blocks=command_history(body["user_id"], body.get("text", "")))
 
 
-@app.message("cluster")
+@timed(HANDLER_SECONDS, "say_hello_regex", errors=HANDLER_ERRORS)
 def say_hello_regex(message, say):
     # logger.debug(message['text'])
-    say(blocks=command_cluster_stats(message["user"]))
+    say(blocks=command_cluster_stats(message["user"], message.get("text", "")))
 
 
+@timed(HANDLER_SECONDS, "open_modal", errors=HANDLER_ERRORS)
 # Listen for a shortcut invocation
-@app.action("action_readme")
 def open_modal(ack, body, client):
     # Acknowledge the command request
     ack()
@@ -198,43 +135,75 @@ def open_modal(ack, body, client):
         # Pass a valid trigger_id within 3 seconds of receiving it
         trigger_id=body["trigger_id"],
         # View payload
-        view={
-            "type": "modal",
-            # View identifier
-            "callback_id": "readme",
-            "title": {
-                "type": "plain_text",
-                "text": "Notes"
-            },
-            "blocks": [
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": "1. The code is here: <https://github.com/subhc/susbot|github link>"
-                    }
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": "2. If the app is not refreshing the server most likely is down. On clicking the  `Refresh` button if an exclamation mark appears beside it the server is down. Ping me. \nIf you are curious run `ls -ltra "
-                                "/work/subha/apps/VGGBot/logs` and check the latest log "
-                    }
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": "3. If your jobs don't show up or the displayed linux username is wrong then the app has failed to find any account matching your Slack full name (not display name) in tritons's `/etc/passwd` database. \nTo fix, "
-                                "run `getent passwd $USER` to look for your full name in triton and set the same on Slack. Furthermore if you have multiple Slack accounts, (maybe one from before you formally joined VGG) your linux account can get mapped to the other Slack account.\nTake a look at the account matching logic <https://github.com/subhc/susbot/blob/main/utils/slack2unix.py|here> "
-                    }
-                }
-            ],
-            "type": "modal"
-        }
+        view=get_readme_view()
     )
 
 
+def create_app(client=None):
+    """`client` replaces the WebClient Bolt creates, e.g. one pointed at a local Slack API in load tests."""
+    app = App(token=os.environ["SLACK_BOT_TOKEN"],
+              signing_secret=os.environ["SLACK_APP_TOKEN"],
+              client=client,
+              logger=logger)
+    app.action("action_refresh_home")(refresh_home)
+    app.action(re.compile(r"^jobs_"))(browse_jobs)
+    app.event("app_home_opened")(update_home_tab)
+    app.event("user_change")(update_slack2unix_map)
+    app.event("team_join")(update_slack2unix_map)
+    app.command("/cluster")(scan_cluster)
+    app.command("/history")(show_history)
+    app.command("/jobs")(query)
+    app.command("/nodes")(query)
+    app.message("cluster")(say_hello_regex)
+    app.action("action_readme")(open_modal)
+    return app
+
+
+def prewarm(startup):
+    """
+    Runs once the Socket Mode connection is up: restores the saved state, starts the background threads and builds
+    the first snapshot and the identity map, so that the first requests do not have to.
+    """
+    try:
+        with startup.phase("restore_state"):
+            restore_state()
+        start_autosave()
+        live_home_tabs.start()
+        start_cluster_histories()
+        with startup.phase("start_collectors"):
+            start_collector()
+        get_publish_queue()
+        with startup.phase("identity_map"):
+            get_slack2unix_map()
+        with startup.phase("snapshot"):  # polled by the collector while the identity map was built
+            get_latest_snapshot()
+        startup.done("warm")
+    except Exception:
+        logger.exception("Prewarming failed, left to the first requests")
+
+
+def start_prewarm(startup):
+    threading.Thread(target=prewarm, args=(startup,), name="prewarm", daemon=True).start()
+
+
 if __name__ == "__main__":
-    SocketModeHandler(app).start()
+    parser = argparse.ArgumentParser(description="susbot: Slurm and other Utilities Slack Bot")
+    parser.add_argument("--mode", choices=["sync", "async"], default=config.BOT_MODE,
+                        help="sync: Bolt App on worker threads, async: Bolt AsyncApp on an asyncio loop with slurm/rendering offloaded to a thread pool")
+    args = parser.parse_args()
+
+    # connect to Slack first, everything else is prewarmed in the background or done by the first request
+    startup = start_timer(STARTED_AT)
+    startup.mark("imports")
+    if config.METRICS_PORT is not None:
+        start_metrics_server(config.METRICS_PORT, config.METRICS_ADDR)
+    if args.mode == "async":
+        import app_async
+        asyncio.run(app_async.start(startup, on_connected=start_prewarm))
+    else:
+        with startup.phase("connect"):
+            handler = SocketModeHandler(create_app())
+            handler.connect()
+        startup.done("ready")
+        start_prewarm(startup)
+        threading.Event().wait()
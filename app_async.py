@@ -0,0 +1,156 @@
+import asyncio
+import functools
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_bolt.async_app import AsyncApp
+
+import config
+from home import get_home_tab_blocks, command_cluster_stats, command_history, get_query_messages, get_readme_view, run_query
+from job_browser import job_browser
+from live_home import live_home_tabs
+from utils.log import get_logger
+from utils.metrics import HANDLER_ERRORS, HANDLER_SECONDS, PAYLOAD_BYTES, timed
+from utils.publisher import get_publish_queue, start_async_publish_queue
+from utils.slack2unix import update_slack_user
+
+logger = get_logger(__name__)
+
+# slurm queries, passwd lookups and rendering block, they run here instead of on the event loop
+executor = ThreadPoolExecutor(max_workers=config.ASYNC_WORKERS, thread_name_prefix="susbot-worker")
+
+
+async def run_blocking(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+@timed(HANDLER_SECONDS, "refresh_home", errors=HANDLER_ERRORS)
+async def refresh_home(ack, body):
+    user_id = body["user"]["id"]
+    await ack()
+    live_home_tabs.touch(user_id)
+    get_publish_queue().submit(
+        user_id,
+        "views.update",
+        view_id=body["view"]["id"],
+        view={
+            "type": "home",
+            "blocks": await run_blocking(get_home_tab_blocks, user_id)
+        }
+    )
+
+
+@timed(HANDLER_SECONDS, "browse_jobs", errors=HANDLER_ERRORS)
+async def browse_jobs(ack, body, action):
+    """Page buttons and filter/sort selects of the job lists, re-renders the home tab with the new page"""
+    user_id = body["user"]["id"]
+    await ack()
+    if not job_browser.handle_action(user_id, action):
+        return
+    live_home_tabs.touch(user_id)
+    get_publish_queue().submit(
+        user_id,
+        "views.update",
+        view_id=body["view"]["id"],
+        view={
+            "type": "home",
+            "blocks": await run_blocking(get_home_tab_blocks, user_id)
+        }
+    )
+
+
+@timed(HANDLER_SECONDS, "update_home_tab", errors=HANDLER_ERRORS)
+async def update_home_tab(event, logger):
+    try:
+        user_id = event["user"]
+        live_home_tabs.touch(user_id)
+        get_publish_queue().submit(
+            user_id,
+            "views.publish",
+            view={
+                "type": "home",
+                "blocks": await run_blocking(get_home_tab_blocks, user_id)
+            }
+        )
+    except Exception:
+        logger.exception(f"Failed to publish home tab")
+
+
+@timed(HANDLER_SECONDS, "update_slack2unix_map", errors=HANDLER_ERRORS)
+async def update_slack2unix_map(event):
+    await run_blocking(update_slack_user, event["user"])
+
+
+@timed(HANDLER_SECONDS, "scan_cluster", errors=HANDLER_ERRORS)
+async def scan_cluster(ack, body):
+    blocks = await run_blocking(command_cluster_stats, body["user_id"], body.get("text", ""))
+    PAYLOAD_BYTES.labels("cluster").observe(len(json.dumps(blocks)))
+    await ack(blocks=blocks)
+
+
+@timed(HANDLER_SECONDS, "query", errors=HANDLER_ERRORS)
+async def query(ack, body, respond):
+    """`/jobs` and `/nodes`, large answers are acknowledged first and sent through the response_url"""
+    kind = body["command"].lstrip("/")
+    result = await run_blocking(run_query, body["user_id"], body.get("text", ""), kind)
+    if result is None or len(result[3]) <= config.QUERY_INLINE_MATCHES:
+        blocks = (await run_blocking(get_query_messages, result, kind))[0]
+        PAYLOAD_BYTES.labels(kind).observe(len(json.dumps(blocks)))
+        await ack(blocks=blocks)
+        return
+    await ack()
+    for blocks in await run_blocking(get_query_messages, result, kind):
+        PAYLOAD_BYTES.labels(kind).observe(len(json.dumps(blocks)))
+        await respond(blocks=blocks, response_type="ephemeral")
+
+
+@timed(HANDLER_SECONDS, "show_history", errors=HANDLER_ERRORS)
+async def show_history(ack, body):
+    await ack(blocks=await run_blocking(command_history, body["user_id"], body.get("text", "")))
+
+
+@timed(HANDLER_SECONDS, "say_hello_regex", errors=HANDLER_ERRORS)
+async def say_hello_regex(message, say):
+    await say(blocks=await run_blocking(command_cluster_stats, message["user"], message.get("text", "")))
+
+
+@timed(HANDLER_SECONDS, "open_modal", errors=HANDLER_ERRORS)
+async def open_modal(ack, body, client):
+    await ack()
+    await client.views_open(
+        trigger_id=body["trigger_id"],
+        view=get_readme_view()
+    )
+
+
+def create_app():
+    """The same commands and actions as `app.create_app`, on Bolt's AsyncApp. Every handler runs as its own task."""
+    app = AsyncApp(token=os.environ["SLACK_BOT_TOKEN"],
+                   signing_secret=os.environ["SLACK_APP_TOKEN"],
+                   logger=logger)
+    app.action("action_refresh_home")(refresh_home)
+    app.action(re.compile(r"^jobs_"))(browse_jobs)
+    app.event("app_home_opened")(update_home_tab)
+    app.event("user_change")(update_slack2unix_map)
+    app.event("team_join")(update_slack2unix_map)
+    app.command("/cluster")(scan_cluster)
+    app.command("/history")(show_history)
+    app.command("/jobs")(query)
+    app.command("/nodes")(query)
+    app.message("cluster")(say_hello_regex)
+    app.action("action_readme")(open_modal)
+    return app
+
+
+async def start(startup, on_connected):
+    """Connects, then calls `on_connected(startup)` and serves until cancelled, see `app.py`"""
+    start_async_publish_queue()  # views are sent from this loop, before prewarm asks for the publish queue
+    with startup.phase("connect"):
+        handler = AsyncSocketModeHandler(create_app())
+        await handler.connect_async()
+    startup.done("ready")
+    on_connected(startup)
+    await asyncio.sleep(float("inf"))
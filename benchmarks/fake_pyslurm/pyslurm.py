@@ -0,0 +1,165 @@
+"""
+Stand-in for pyslurm, generates a synthetic cluster with the keys the bot reads from pyslurm's node/job dicts.
+Put this directory first on `sys.path` and call `configure()` to pick the cluster size.
+"""
+import random
+import time
+
+# (gpu type, gpu memory, gpus per node, cpus per node, memory per node in MB)
+GPU_NODE_TYPES = [
+    ("a6000", "48G", 8, 48, 512000),
+    ("a40", "48G", 8, 48, 512000),
+    ("a4500", "20G", 8, 32, 256000),
+    ("rtx8k", "48G", 8, 40, 384000),
+    ("rtx6k", "24G", 8, 40, 384000),
+    ("v100s", "32G", 4, 32, 256000),
+    ("p40", "24G", 4, 24, 128000),
+    ("m40", "12G", 4, 24, 128000),
+]
+GPU_PARTITIONS = ["gpu", "ddp-4way", "ddp-2way"]
+NODE_STATES = ["MIXED"] * 12 + ["ALLOCATED"] * 4 + ["IDLE"] * 2 + ["MIXED+DRAIN", "DOWN+NOT_RESPONDING", "IDLE+RESERVED"]
+PENDING_REASONS = ["Priority"] * 6 + ["Resources"] * 3 + ["QOSMaxGRESPerUser", "Dependency", "ReqNodeNotAvail, UnavailableNodes:gnode001", "JobArrayTaskLimit"]
+NOW = 1700000000
+FIRST_UID = 2000
+
+_nodes = {}
+_jobs = {}
+_last_update = 0
+
+
+def _fmt_duration(seconds):
+    days, seconds = divmod(int(seconds), 24 * 3600)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{days}-{hours:02d}:{minutes:02d}:{seconds:02d}" if days else f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def _make_node(rng, index, num_nodes):
+    if index >= num_nodes * 0.9:  # cpu only nodes
+        return f"cpu{index:04d}", {
+            "gres": [], "gres_used": [], "features": "cpu", "partitions": ["compute"], "state": rng.choice(NODE_STATES),
+            "cpus": 64, "alloc_cpus": 0, "real_memory": 512000, "alloc_mem": 0,
+        }
+    gpu_type, gmem, gpus, cpus, memory = GPU_NODE_TYPES[index % len(GPU_NODE_TYPES)]
+    return f"gnode{index:04d}", {
+        "gres": [f"gpu:{gpu_type}:{gpus}(S:0-1)"],
+        "gres_used": [f"gpu:{gpu_type}:0(IDX:N/A)"],
+        "features": f"gmem{gmem},{gpu_type}",
+        "partitions": [GPU_PARTITIONS[index % len(GPU_PARTITIONS)], "low-prio-gpu"],
+        "state": rng.choice(NODE_STATES),
+        "cpus": cpus, "alloc_cpus": 0, "real_memory": memory, "alloc_mem": 0,
+        "_gpus": gpus, "_gpus_used": 0, "_type": gpu_type,
+    }
+
+
+def _make_job(rng, job_id, num_users, gpu_nodes, array_job_id=None):
+    node_name = rng.choice(gpu_nodes) if gpu_nodes else None
+    node = _nodes.get(node_name)
+    partition = rng.choice(node["partitions"]) if node else "compute"
+    num_gpus = rng.choice([1, 1, 1, 2, 4, 8]) if node else 0
+    cpus = max(1, num_gpus) * rng.choice([4, 6, 8])
+    memory = cpus * 8000
+    running = (node is not None and array_job_id is None and rng.random() < 0.6
+               and node["_gpus_used"] + num_gpus <= node["_gpus"] and node["alloc_cpus"] + cpus <= node["cpus"])
+    if running:
+        node["_gpus_used"] += num_gpus
+        node["alloc_cpus"] += cpus
+        node["alloc_mem"] += memory
+        node["gres_used"] = [f"gpu:{node['_type']}:{node['_gpus_used']}(IDX:0-{node['_gpus_used'] - 1})"]
+    run_time = rng.randint(0, 4 * 24 * 3600) if running else 0
+    time_limit = rng.choice([2, 24, 48, 96]) * 3600
+    mem_per_cpu = rng.random() < 0.3
+    return {
+        "job_id": job_id,
+        "array_job_id": array_job_id or 0,
+        "name": f"train_{rng.choice(['resnet', 'vit', 'clip', 'diffusion', 'nerf', 'llm'])}_{job_id}",
+        "job_state": "RUNNING" if running else "PENDING",
+        "state_reason": "None" if running else rng.choice(PENDING_REASONS),
+        "partition": partition,
+        "user_id": FIRST_UID + int(rng.paretovariate(1.2) * 3) % num_users,
+        "batch_flag": int(rng.random() < 0.8),
+        "batch_host": node_name if running else None,
+        "tres_req_str": f"cpu={cpus},mem={memory}M,node=1,billing={cpus}" + (f",gres/gpu={num_gpus}" if num_gpus else ""),
+        "cpus_allocated": {node_name: cpus} if running else {},
+        "mem_per_cpu": mem_per_cpu,
+        "min_memory_cpu": 8000 if mem_per_cpu else None,
+        "mem_per_node": not mem_per_cpu,
+        "min_memory_node": None if mem_per_cpu else memory,
+        "start_time": NOW - run_time if running else 0,
+        "end_time": NOW - run_time + time_limit if running else 0,
+        "submit_time": NOW - run_time - rng.randint(0, 3600),
+        "run_time": run_time,
+        "run_time_str": _fmt_duration(run_time),
+        "time_limit": time_limit // 60,
+        "time_limit_str": _fmt_duration(time_limit),
+        "priority": rng.randint(1, 100000),
+    }
+
+
+def configure(num_nodes=50, num_jobs=500, num_users=200, array_fraction=0.5, seed=0):
+    """Generates a cluster of `num_nodes` nodes and `num_jobs` jobs, `array_fraction` of them pending array tasks."""
+    global _last_update
+    rng = random.Random(seed)
+    _nodes.clear()
+    _jobs.clear()
+    for index in range(num_nodes):
+        name, node = _make_node(rng, index, num_nodes)
+        _nodes[name] = node
+    gpu_nodes = [name for name, node in _nodes.items() if node["gres"]]
+    job_id = 100000
+    num_array_tasks = int(num_jobs * array_fraction)
+    while len(_jobs) < num_jobs - num_array_tasks:
+        _jobs[job_id] = _make_job(rng, job_id, num_users, gpu_nodes)
+        job_id += 1
+    while len(_jobs) < num_jobs:
+        array_job_id = job_id
+        for _ in range(min(rng.choice([10, 100, 1000]), num_jobs - len(_jobs))):
+            _jobs[job_id] = _make_job(rng, job_id, num_users, gpu_nodes, array_job_id=array_job_id)
+            job_id += 1
+    _last_update = time.time()
+
+
+def submit(**fields):
+    """Adds a pending job like `_make_job` would and moves the update time of the job table, returns its id"""
+    global _last_update
+    job_id = max(_jobs, default=99999) + 1
+    _jobs[job_id] = {**_make_job(random.Random(job_id), job_id, 1, []), **fields}
+    _last_update = max(time.time(), _last_update + 1)
+    return job_id
+
+
+def _public(record):
+    return {key: value for key, value in record.items() if not key.startswith("_")}
+
+
+class node:
+    def get(self):
+        return {name: _public(record) for name, record in _nodes.items()}
+
+
+class job:
+    """Like pyslurm's, `lastUpdate()` is the update time of the table as of this handle's last `get()`"""
+
+    def __init__(self):
+        self._lastUpdate = 0
+
+    def get(self):
+        self._lastUpdate = _last_update
+        return {job_id: dict(record) for job_id, record in _jobs.items()}
+
+    def ids(self):
+        return list(_jobs)
+
+    def lastUpdate(self):
+        return self._lastUpdate
+
+    def find_user(self, user):
+        return {job_id: dict(record) for job_id, record in _jobs.items() if record["user_id"] == user}
+
+
+class statistics:
+    def get(self):
+        return {"jobs_submitted": len(_jobs), "jobs_running": sum(1 for record in _jobs.values() if record["job_state"] == "RUNNING")}
+
+
+configure()
@@ -0,0 +1,83 @@
+"""
+Local stand-in for the Slack Web API. Point a WebClient at it with `WebClient(base_url=FakeSlackApi.url)`:
+every call is answered with `{"ok": true, ...}` after `latency` seconds and recorded with its payload size.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+AUTH_TEST = {"ok": True, "url": "https://load-test.slack.com/", "team": "load-test", "user": "susbot", "team_id": "T00000000",
+             "user_id": "UBOT00000", "bot_id": "BBOT00000", "is_enterprise_install": False}
+
+
+class SlackCall:
+    __slots__ = ("method", "body", "size", "received_at")
+
+    def __init__(self, method, body, size, received_at):
+        self.method = method
+        self.body = body
+        self.size = size
+        self.received_at = received_at
+
+
+class FakeSlackApi:
+    def __init__(self, latency=0.05, port=0, on_call=None):
+        self.latency = latency
+        self.on_call = on_call
+        self.calls = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-slack-api", daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/api/"
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    body = json.loads(raw or b"{}")
+                else:
+                    body = dict(parse_qsl(raw.decode()))
+                response = api.record(self.path.rsplit("/", 1)[-1], body, len(raw))
+                payload = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def record(self, method, body, size):
+        time.sleep(self.latency)
+        call = SlackCall(method, body, size, time.perf_counter())
+        with self._lock:
+            self.calls.append(call)
+        if self.on_call is not None:
+            self.on_call(call)
+        if method == "auth.test":
+            return AUTH_TEST
+        if method.startswith("views."):
+            return {"ok": True, "view": {"id": "V00000000", **(body.get("view") if isinstance(body.get("view"), dict) else {})}}
+        if method == "chat.postMessage":
+            return {"ok": True, "channel": body.get("channel"), "ts": f"{time.time():.6f}"}
+        return {"ok": True}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
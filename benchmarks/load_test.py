@@ -0,0 +1,213 @@
+"""
+Replays concurrent Slack requests against the handlers of `app.py`, through Bolt's dispatch as Socket Mode would,
+with a synthetic cluster (fake pyslurm) and a local fake Slack Web API.
+
+    python benchmarks/load_test.py --requests 500 --rate 20 --arrival poisson --concurrency 10
+    python benchmarks/load_test.py --requests 200 --arrival burst --mix home=1
+
+Request kinds: `home` (app_home_opened, done when views.publish reaches Slack), `command` (/cluster, done when
+acked with the blocks) and `dm` ("cluster" message, done when chat.postMessage reaches Slack).
+Reports the throughput, ack and completion latency percentiles, acks later than Slack's 3 second deadline,
+payload sizes and the Slack Web API calls made.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCHMARKS_DIR, "fake_pyslurm"), os.path.dirname(BENCHMARKS_DIR), BENCHMARKS_DIR]
+os.environ.setdefault("SLACK_BOT_TOKEN", "xoxb-load-test")
+os.environ.setdefault("SLACK_APP_TOKEN", "xapp-load-test")
+
+from slack_bolt.request import BoltRequest
+from slack_sdk import WebClient
+
+import app
+import config
+from cluster.collector import start_collector
+from fake_slack import FakeSlackApi
+from run import SIZES, setup
+from utils import publisher, slack2unix
+
+ACK_DEADLINE = 3.
+
+
+def get_schedule(num_requests, arrival, rate, mix, seed):
+    """(seconds from the start, request kind) of every request"""
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=num_requests)
+    if arrival == "burst":
+        return [(0., kind) for kind in kinds]
+    at, schedule = 0., []
+    for kind in kinds:
+        schedule.append((at, kind))
+        at += rng.expovariate(rate) if arrival == "poisson" else 1 / rate
+    return schedule
+
+
+def make_body(kind, n, user_id):
+    if kind == "command":
+        return {"command": "/cluster", "text": "", "user_id": user_id, "channel_id": f"D{n:08d}", "team_id": "T00000000",
+                "response_url": "https://hooks.slack.com/commands/load-test", "trigger_id": f"{n}.trigger"}
+    if kind == "home":
+        event = {"type": "app_home_opened", "user": user_id, "channel": f"D{n:08d}", "tab": "home", "event_ts": f"{time.time():.6f}"}
+    else:
+        event = {"type": "message", "channel_type": "im", "user": user_id, "channel": f"D{n:08d}", "text": "cluster", "ts": f"{time.time():.6f}"}
+    return {"type": "event_callback", "team_id": "T00000000", "api_app_id": "A00000000", "event": event,
+            "event_id": f"Ev{n:08d}", "event_time": int(time.time())}
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+class LoadTest:
+    def __init__(self, bolt_app, slack_api, user_ids):
+        self.app = bolt_app
+        self.slack_api = slack_api
+        self.user_ids = user_ids
+        self._lock = threading.Lock()
+        self._waiting = defaultdict(list)  # (slack method, user or channel) -> request numbers waiting for that call
+        self.results = {}  # request number -> dict(kind, start, ack, done, status, payload)
+
+    def on_call(self, call):
+        if call.method == "views.publish":
+            key = ("views.publish", call.body.get("user_id"))
+        elif call.method == "chat.postMessage":
+            key = ("chat.postMessage", call.body.get("channel"))
+        else:
+            return
+        with self._lock:
+            for n in self._waiting.pop(key, []):
+                self.results[n]["done"] = call.received_at
+                self.results[n]["payload"] = call.size
+
+    def send(self, n, kind, start):
+        user_id = self.user_ids[n % len(self.user_ids)]
+        body = make_body(kind, n, user_id)
+        result = self.results[n] = dict(kind=kind, start=start, ack=None, done=None, status=None, payload=None)
+        if kind == "home":
+            with self._lock:
+                self._waiting[("views.publish", user_id)].append(n)
+        elif kind == "dm":
+            with self._lock:
+                self._waiting[("chat.postMessage", body["event"]["channel"])].append(n)
+        response = self.app.dispatch(BoltRequest(body=body, mode="socket_mode"))
+        result["ack"] = time.perf_counter()
+        result["status"] = response.status
+        if kind == "command":
+            result["done"] = result["ack"]
+            result["payload"] = len(response.body.encode())
+
+    def run(self, schedule, concurrency):
+        # Socket Mode hands every envelope to a thread pool, `concurrency` is its size
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="socket-mode") as pool:
+            t0 = time.perf_counter()
+            for n, (at, kind) in enumerate(schedule):
+                if (delay := t0 + at - time.perf_counter()) > 0:
+                    time.sleep(delay)
+                pool.submit(self.send, n, kind, t0 + at)
+        return t0
+
+    def wait(self, timeout):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            with self._lock:
+                if not any(self._waiting.values()):
+                    return
+            time.sleep(0.05)
+
+    def report(self, t0):
+        report = {"kinds": {}, "slack_calls": {}}
+        finished = [result["done"] for result in self.results.values() if result["done"] is not None]
+        report["completed"] = len(finished)
+        report["requests"] = len(self.results)
+        report["throughput"] = len(finished) / (max(finished) - t0) if finished else 0.
+        by_kind = defaultdict(list)
+        for result in self.results.values():
+            by_kind[result["kind"]].append(result)
+        for kind, results in sorted(by_kind.items()):
+            acks = [result["ack"] - result["start"] for result in results if result["ack"] is not None]
+            dones = [result["done"] - result["start"] for result in results if result["done"] is not None]
+            payloads = [result["payload"] for result in results if result["payload"] is not None]
+            report["kinds"][kind] = {
+                "requests": len(results),
+                "ack_p50": percentile(acks, 50), "ack_p90": percentile(acks, 90), "ack_p99": percentile(acks, 99), "ack_max": max(acks, default=float("nan")),
+                "ack_misses": sum(1 for ack in acks if ack > ACK_DEADLINE) + sum(1 for result in results if result["status"] != 200),
+                "done_p50": percentile(dones, 50), "done_p90": percentile(dones, 90), "done_p99": percentile(dones, 99),
+                "unfinished": len(results) - len(dones),
+                "payload_avg": sum(payloads) / len(payloads) if payloads else 0, "payload_max": max(payloads, default=0),
+            }
+        calls = defaultdict(list)
+        for call in self.slack_api.calls:
+            calls[call.method].append(call.size)
+        report["slack_calls"] = {method: {"calls": len(sizes), "payload_avg": sum(sizes) / len(sizes), "payload_max": max(sizes)}
+                                 for method, sizes in sorted(calls.items())}
+        return report
+
+
+def print_report(report):
+    print(f"{report['completed']}/{report['requests']} requests completed, {report['throughput']:.1f} requests/s")
+    print(f"{'kind':<8} {'n':>5} {'ack p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'misses':>7} {'done p50':>9} {'p90':>9} {'p99':>9} {'payload avg':>12} {'max':>9}")
+    for kind, r in report["kinds"].items():
+        print(f"{kind:<8} {r['requests']:>5} {r['ack_p50'] * 1000:>7.0f}ms {r['ack_p90'] * 1000:>7.0f}ms {r['ack_p99'] * 1000:>7.0f}ms {r['ack_max'] * 1000:>7.0f}ms "
+              f"{r['ack_misses']:>7} {r['done_p50'] * 1000:>7.0f}ms {r['done_p90'] * 1000:>7.0f}ms {r['done_p99'] * 1000:>7.0f}ms {r['payload_avg']:>11.0f}B {r['payload_max']:>8}B")
+    print("Slack Web API calls:")
+    for method, r in report["slack_calls"].items():
+        print(f"  {method:<20} {r['calls']:>6} calls {r['payload_avg']:>10.0f}B avg {r['payload_max']:>8}B max")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="susbot load test against a local fake Slack and a synthetic cluster")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--arrival", choices=["constant", "poisson", "burst"], default="poisson")
+    parser.add_argument("--rate", type=float, default=20., help="requests per second for constant and poisson arrivals")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests handled at the same time, like the Socket Mode thread pool")
+    parser.add_argument("--mix", default="home=6,command=2,dm=2", help="relative weights of the request kinds")
+    parser.add_argument("--size", choices=list(SIZES), default="medium", help="synthetic cluster size, see run.py")
+    parser.add_argument("--slack-latency", type=float, default=0.05, help="seconds the fake Slack API takes to answer")
+    parser.add_argument("--views-per-minute", type=int, help="views.* rate limit of the publish queue instead of config.SLACK_RATE_LIMITS")
+    parser.add_argument("--timeout", type=float, default=60., help="seconds to wait for pending views/messages at the end")
+    parser.add_argument("--output", help="json file to save the report to")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    setup(args.size, seed=args.seed)
+    start_collector()
+    slack_api = FakeSlackApi(latency=args.slack_latency).start()
+    client = WebClient(token=os.environ["SLACK_BOT_TOKEN"], base_url=slack_api.url)
+    rate_limits = dict(config.SLACK_RATE_LIMITS)
+    if args.views_per_minute:
+        rate_limits.update({method: (args.views_per_minute, burst) for method, (_, burst) in rate_limits.items() if method.startswith("views.")})
+    publish_queue = publisher._publish_queue = publisher.PublishQueue(client=client, rate_limits=rate_limits)
+    publish_queue.published_views.is_unchanged = lambda user_id, view: False  # every request has to reach Slack
+    publish_queue.start()
+
+    user_ids = [user["id"] for user in slack2unix.get_slack_users()]
+    load_test = LoadTest(app.create_app(client=client), slack_api, user_ids)
+    slack_api.on_call = load_test.on_call
+    mix = {kind: float(weight) for kind, weight in (item.split("=") for item in args.mix.split(","))}
+    t0 = load_test.run(get_schedule(args.requests, args.arrival, args.rate, mix, args.seed), args.concurrency)
+    load_test.wait(args.timeout)
+
+    report = load_test.report(t0)
+    report["args"] = vars(args)
+    report["publish_queue"] = publish_queue.stats()
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    slack_api.stop()
+
+
+if __name__ == "__main__":
+    main()
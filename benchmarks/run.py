@@ -0,0 +1,138 @@
+"""
+Benchmarks the block builders and the slack2unix matching on synthetic clusters of increasing size.
+
+    python benchmarks/run.py --sizes small medium --output benchmarks/results/main.json
+    python benchmarks/run.py --baseline benchmarks/results/main.json
+
+Reports the median wall time, the peak traced memory and the number of memory blocks allocated by every
+benchmark. With `--baseline` it exits with 1 if a benchmark got slower or bigger than `--tolerance` times its
+baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCHMARKS_DIR, "fake_pyslurm"), os.path.dirname(BENCHMARKS_DIR), BENCHMARKS_DIR]
+
+import pyslurm  # the fake one
+from cluster.job import project_job_dict
+from cluster.node import get_lp_node_info, get_node_info_blocks, get_node_user_blocks, get_user_jobs_blocks
+from cluster.snapshot import ClusterSnapshot
+from synthetic_users import make_users
+from utils import passwd, slack2unix
+from utils.matcher import IdentityMatcher
+
+# name -> (nodes, jobs, linux users, slack users)
+SIZES = {
+    "small": (50, 500, 200, 260),
+    "medium": (200, 5000, 500, 650),
+    "large": (1000, 30000, 1500, 2000),
+    "xlarge": (2000, 100000, 3000, 4000),
+}
+
+
+def setup(size, seed=0):
+    num_nodes, num_jobs, num_linux_users, num_slack_users = SIZES[size]
+    pyslurm.configure(num_nodes=num_nodes, num_jobs=num_jobs, num_users=num_linux_users, seed=seed)
+    passwd_entries, slack_users = make_users(num_linux_users, num_slack_users, first_uid=pyslurm.FIRST_UID, seed=seed)
+    passwd_index = passwd.PasswdIndex(ttl=float("inf"), check_interval=float("inf"))
+    passwd_index.import_state({"entries": [list(entry) for entry in passwd_entries], "mtime": None, "loaded_at": time.time()})
+    passwd._passwd_index = passwd_index
+    slack2unix.get_slack_users.cache.put(slack_users)
+    return pyslurm.node().get(), project_job_dict(pyslurm.job().get())
+
+
+def get_benchmarks(node_dict, job_dict):
+    snapshot = ClusterSnapshot(node_dict, job_dict)
+    top_user = max(snapshot.jobs_by_user, key=lambda user: len(snapshot.jobs_by_user[user]))
+
+    def slack2unix_map():
+        slack2unix._matcher = IdentityMatcher()
+        return slack2unix.get_slack2unix_map()
+
+    return {
+        "get_lp_node_info": lambda: get_lp_node_info(job_dict),
+        "ClusterSnapshot": lambda: ClusterSnapshot(node_dict, job_dict),
+        "get_node_info_blocks": lambda: get_node_info_blocks(snapshot),
+        "get_node_user_blocks": lambda: get_node_user_blocks(snapshot, "All GPUs", limit=52),
+        "get_user_jobs_blocks[user]": lambda: get_user_jobs_blocks(snapshot, top_user, state="RUNNING"),
+        "get_user_jobs_blocks[pending]": lambda: get_user_jobs_blocks(snapshot, None, state="PENDING"),
+        "get_slack2unix_map[cold]": slack2unix_map,
+    }
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del result
+    allocations = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return {"time_median": statistics.median(times), "time_min": min(times), "peak_kb": peak / 1024, "allocations": allocations}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for size, benchmarks in results["sizes"].items():
+        for name, result in benchmarks.items():
+            if (base := baseline["sizes"].get(size, {}).get(name)) is None:
+                continue
+            for metric in ["time_median", "peak_kb"]:
+                if base[metric] > 0 and result[metric] / base[metric] > tolerance:
+                    regressions.append(f"{size:>7} {name:<30} {metric:<12} {base[metric]:10.4f} -> {result[metric]:10.4f} ({result[metric] / base[metric]:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="susbot builder benchmarks on a synthetic cluster")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium", "large"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", help="run only these benchmarks")
+    parser.add_argument("--output", help="json file to save the results to")
+    parser.add_argument("--baseline", help="json results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="max allowed ratio to the baseline")
+    args = parser.parse_args()
+
+    results = {"created_at": time.time(), "python": platform.python_version(), "repeat": args.repeat, "sizes": {}}
+    for size in args.sizes:
+        node_dict, job_dict = setup(size)
+        print(f"{size}: {len(node_dict)} nodes, {len(job_dict)} jobs")
+        results["sizes"][size] = {}
+        for name, func in get_benchmarks(node_dict, job_dict).items():
+            if args.only and name not in args.only:
+                continue
+            result = results["sizes"][size][name] = measure(func, args.repeat)
+            print(f"  {name:<30} {result['time_median'] * 1000:10.2f} ms {result['peak_kb']:12.0f} KiB peak {result['allocations']:10d} allocations")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions over {args.tolerance}x the baseline:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Synthetic passwd entries and Slack users.list members with the usual ways Slack names drift from the GECOS field."""
+import pwd
+import random
+
+FIRST_NAMES = (
+    "james mary john patricia robert jennifer michael linda william elizabeth david barbara richard susan joseph jessica "
+    "thomas sarah charles karen christopher nancy daniel lisa matthew betty anthony margaret mark sandra donald ashley "
+    "steven kimberly paul emily andrew donna joshua michelle kenneth carol kevin amanda brian dorothy george melissa "
+    "timothy deborah ronald stephanie edward rebecca jason sharon jeffrey laura ryan cynthia jacob kathleen gary amy "
+    "nicholas angela eric shirley jonathan anna stephen brenda larry pamela justin emma scott nicole brandon helen "
+    "józef zoë andré françois søren jürgen siddharth subhabrata tengda weidi yuki xin wei li"
+).split()
+LAST_NAMES = (
+    "smith johnson williams brown jones garcia miller davis rodriguez martinez hernandez lopez gonzalez wilson anderson "
+    "thomas taylor moore jackson martin lee perez thompson white harris sanchez clark ramirez lewis robinson walker young "
+    "allen king wright scott torres nguyen hill flores green adams nelson baker hall rivera campbell mitchell carter "
+    "müller schröder núñez zisserman vedaldi chatterjee han xie zhang wang liu chen yang huang zhao wu zhou sun ma zhu"
+).split()
+
+
+def _full_name(rng):
+    return rng.choice(FIRST_NAMES).title(), rng.choice(LAST_NAMES).title()
+
+
+def _slack_name(rng, first, last):
+    variant = rng.random()
+    if variant < 0.5:
+        return f"{first} {last}"
+    if variant < 0.6:
+        return f"{first[0]}. {last}"
+    if variant < 0.7:
+        return f"{first} {rng.choice(FIRST_NAMES).title()} {last}"
+    if variant < 0.8:
+        return f"{first.lower()} {last.lower()}"
+    if variant < 0.9:
+        return " ".join(_full_name(rng))  # someone without a cluster account
+    return first
+
+
+def make_users(num_linux_users, num_slack_users, first_uid=2000, seed=0):
+    """
+    Returns:
+        list: `num_linux_users` pwd.struct_passwd entries with uids from `first_uid`
+        list: `num_slack_users` users.list members, the first ones belong to the first linux users
+    """
+    rng = random.Random(seed)
+    passwd_entries, slack_users = [], []
+    for i in range(max(num_linux_users, num_slack_users)):
+        first, last = _full_name(rng)
+        if i < num_linux_users:
+            gecos = f"{first} {last}" + (",,," if rng.random() < 0.3 else "")
+            passwd_entries.append(pwd.struct_passwd((f"{first[0].lower()}{last.lower()}{i}", "x", first_uid + i, first_uid, gecos, f"/home/u{i}", "/bin/bash")))
+        if i < num_slack_users:
+            slack_users.append({"id": f"U{i:08d}", "real_name": _slack_name(rng, first, last), "deleted": False, "is_bot": False})
+    return passwd_entries, slack_users
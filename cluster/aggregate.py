@@ -0,0 +1,63 @@
+STAT_COLUMNS = ["jobs", "total", "shell", "hrs24"]
+
+
+class UserGpuSummary:
+    """
+    Running jobs of a snapshot projected once into columns (user, partition, gpu type, #gpus, batch flag, run time)
+    and grouped by (partition, user) in a single pass. Every per-user view is then a sum over the partitions it keeps.
+
+    `counts[p, u]` holds the number of jobs, the total/interactive/≥24h gpu counts and the gpu count per gpu type
+    of user `users[u]` in partition `partitions[p]`.
+    """
+
+    def __init__(self, snapshot):
+        import numpy as np  # imported on first use, keeps numpy out of startup
+
+        users, partitions = {}, {}
+        self.gpu_types = list(snapshot.gpu2gmem)
+        gpu_codes = {gpu: i for i, gpu in enumerate(self.gpu_types)}
+        unknown_gpu = len(self.gpu_types)
+
+        user_col, partition_col, gpu_col, num_gpus_col, batch_col, run_time_col = [], [], [], [], [], []
+        for job_info in snapshot.job_dict.values():
+            if job_info.job_state != "RUNNING":
+                continue
+            user_col.append(users.setdefault(snapshot.uid2user[job_info.user_id], len(users)))
+            partition_col.append(partitions.setdefault(job_info.partition, len(partitions)))
+            gpu_col.append(gpu_codes.get(snapshot.node2gpu.get(job_info.batch_host, (None,))[0], unknown_gpu))
+            num_gpus_col.append(job_info.num_gpus)
+            batch_col.append(job_info.batch_flag)
+            run_time_col.append(job_info.run_time)
+
+        self.users = list(users)
+        self.partitions = list(partitions)
+        user_col = np.asarray(user_col, dtype=np.int32)
+        partition_col = np.asarray(partition_col, dtype=np.int32)
+        gpu_col = np.asarray(gpu_col, dtype=np.int32)
+        num_gpus_col = np.asarray(num_gpus_col, dtype=np.int64)
+        batch_col = np.asarray(batch_col, dtype=np.int64)
+        run_time_col = np.asarray(run_time_col, dtype=np.int64)
+
+        n_stats = len(STAT_COLUMNS)
+        values = np.zeros((len(user_col), n_stats + unknown_gpu + 1), dtype=np.int64)
+        values[:, 0] = 1
+        values[:, 1] = num_gpus_col
+        values[:, 2] = num_gpus_col * (batch_col == 0)
+        values[:, 3] = num_gpus_col * (run_time_col >= 24 * 60 * 60)
+        values[np.arange(len(user_col)), n_stats + gpu_col] = num_gpus_col
+
+        self.counts = np.zeros((len(self.partitions), len(self.users), values.shape[1]), dtype=np.int64)
+        np.add.at(self.counts, (partition_col, user_col), values)
+
+    def select(self, ignore_partition=("compute")):
+        """
+        Returns:
+            dict: user -> {"total", "shell", "hrs24", <gpu type>...: #gpus} over the partitions not in `ignore_partition`,
+                only for users with at least one running job there.
+        """
+        import numpy as np
+
+        keep = np.array([p not in ignore_partition for p in self.partitions], dtype=bool)
+        counts = self.counts[keep].sum(axis=0) if len(keep) else self.counts.sum(axis=0)
+        columns = STAT_COLUMNS[1:] + self.gpu_types
+        return {user: dict(zip(columns, row[1:1 + len(columns)])) for user, row in zip(self.users, counts.tolist()) if row[0] > 0}
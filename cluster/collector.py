@@ -0,0 +1,178 @@
+import threading
+import time
+
+import config
+from cluster.job import JobRecord
+from cluster.poller import SlurmWorker
+from cluster.query import get_node_index
+from cluster.query_slurm import get_slum_node_dict, get_slum_job_dict
+from cluster.registry import get_cluster, get_clusters
+from cluster.snapshot import ClusterSnapshot, get_cluster_snapshot
+from utils.log import get_logger
+from utils.metrics import Counter, Histogram, register_collector
+from utils.persist import register_state
+
+logger = get_logger(__name__)
+
+POLL_SECONDS = Histogram("susbot_collector_poll_seconds", "Time to poll slurmctld and build a snapshot", ["cluster"])
+POLL_ERRORS = Counter("susbot_collector_poll_errors", "Polls that failed or timed out", ["cluster"])
+
+
+class SnapshotCollector(threading.Thread):
+    """
+    Polls the slurmctld of `cluster` every `interval` seconds on its own thread and swaps in a fresh ClusterSnapshot.
+    Readers only ever see a fully built snapshot: the reference is replaced in one assignment and
+    a snapshot is never modified after it has been published.
+
+    Every cluster has its own collector, a slow or unreachable controller only delays the snapshots of its cluster.
+    Clusters with their own slurm.conf are polled through a SlurmWorker process.
+    The job and node indexes of `/jobs`, `/nodes` and the job lists are built here too, before the snapshot is
+    published, so that no request pays for them.
+    """
+
+    def __init__(self, cluster=None, interval=config.SLURM_POLL_INTERVAL):
+        self.cluster = cluster or get_cluster()
+        super().__init__(name=f"slurm-collector-{self.cluster.name}", daemon=True)
+        self.interval = interval
+        self.snapshot = None
+        self._worker = SlurmWorker(self.cluster) if self.cluster.remote else None
+        self._listeners = []
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+
+    def _fetch(self):
+        if self._worker is not None:
+            return self._worker.poll()
+        return get_slum_node_dict(), get_slum_job_dict()
+
+    def poll(self):
+        start = time.time()
+        with POLL_SECONDS.labels(self.cluster.name).time():
+            snapshot = ClusterSnapshot(*self._fetch(), cluster=self.cluster)
+            get_node_index(snapshot)  # and the job index it is built from
+        previous, self.snapshot = self.snapshot, snapshot
+        logger.debug(f"Collected {self.cluster.name} snapshot with {len(snapshot.node_dict)} nodes, {len(snapshot.job_dict)} jobs in {time.time() - start:.2f}s",
+                     extra={"cluster": self.cluster.name, "seconds": round(time.time() - start, 4)})
+        for listener in self._listeners:
+            try:
+                listener(previous, snapshot)
+            except Exception:
+                logger.exception(f"Snapshot listener {listener} failed")
+
+    def add_listener(self, listener):
+        """Calls `listener(previous_snapshot, snapshot)` on the collector thread after every new snapshot is published."""
+        self._listeners.append(listener)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            start = time.time()
+            try:
+                self.poll()
+            except (TimeoutError, ConnectionError) as e:
+                POLL_ERRORS.labels(self.cluster.name).inc()
+                logger.error(f"Failed to collect {self.cluster.name} snapshot: {e}")
+            except Exception:
+                POLL_ERRORS.labels(self.cluster.name).inc()
+                logger.exception(f"Failed to collect {self.cluster.name} snapshot")
+            self._ready.set()
+            self._stop_event.wait(max(0., self.interval - (time.time() - start)))
+
+    def stop(self):
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.stop()
+
+    def export_state(self):
+        if (snapshot := self.snapshot) is None:
+            return None
+        return {"created_at": snapshot.created_at, "node_dict": snapshot.node_dict,
+                "job_dict": {job_id: job_info.to_dict() for job_id, job_info in snapshot.job_dict.items()}}
+
+    def import_state(self, state):
+        """Publishes the snapshot of `export_state()` until the first poll replaces it, its age shows how old it is."""
+        if self.snapshot is None:
+            job_dict = {int(job_id): JobRecord(**job_info) for job_id, job_info in state["job_dict"].items()}
+            self.snapshot = ClusterSnapshot(state["node_dict"], job_dict, created_at=state["created_at"], cluster=self.cluster)
+            self._ready.set()
+
+    def get_snapshot(self, timeout=None):
+        if self.snapshot is None:
+            self._ready.wait(timeout)
+        return self.snapshot
+
+
+_collectors = {}  # cluster name -> SnapshotCollector
+
+
+def get_collectors():
+    """cluster name -> SnapshotCollector of every cluster in config.CLUSTERS, the default one first"""
+    if len(_collectors) != len(get_clusters()):
+        for name, cluster in get_clusters().items():
+            if name not in _collectors:
+                _collectors[name] = SnapshotCollector(cluster)
+    return _collectors
+
+
+def get_collector(name=None):
+    """SnapshotCollector of cluster `name`, of the default cluster if None"""
+    return get_collectors()[get_cluster(name).name]
+
+
+def start_collector():
+    """Starts the collectors of every cluster, returns the one of the default cluster"""
+    for collector in get_collectors().values():
+        if not collector.is_alive():
+            collector.start()
+    return get_collector()
+
+
+def get_latest_snapshot(name=None):
+    """
+    Latest snapshot of cluster `name` (the default cluster if None) from its background collector. Falls back to
+    querying slurm inline if the collector is not running or has not produced a snapshot yet, unless the cluster
+    is polled from a worker process: then None is returned after the wait.
+    """
+    collector = _collectors.get(get_cluster(name).name)
+    if collector is not None and (snapshot := collector.get_snapshot(timeout=config.SLURM_POLL_TIMEOUT)) is not None:
+        return snapshot
+    return get_cluster_snapshot() if not get_cluster(name).remote else None
+
+
+def get_latest_snapshots():
+    """
+    cluster name -> latest snapshot (or None if there is none yet) of every cluster. Only the default cluster is
+    waited for, like `get_latest_snapshot()`, the others return whatever their collector has right now.
+    """
+    default = get_cluster().name
+    snapshots = {default: get_latest_snapshot()}
+    for name in get_clusters():
+        if name != default:
+            snapshots[name] = _collectors[name].snapshot if name in _collectors else None
+    return snapshots
+
+
+def _collect_snapshot_metrics():
+    snapshots = [(name, collector.snapshot) for name, collector in list(_collectors.items()) if collector.snapshot is not None]
+    if not snapshots:
+        return []
+    return [
+        ("susbot_snapshot_age_seconds", "gauge", "Age of the latest cluster snapshot", [({"cluster": name}, snapshot.age) for name, snapshot in snapshots]),
+        ("susbot_snapshot_jobs", "gauge", "Jobs in the latest cluster snapshot", [({"cluster": name}, len(snapshot.job_dict)) for name, snapshot in snapshots]),
+        ("susbot_snapshot_nodes", "gauge", "Nodes in the latest cluster snapshot", [({"cluster": name}, len(snapshot.node_dict)) for name, snapshot in snapshots]),
+    ]
+
+
+def _export_snapshots():
+    return {name: state for name, collector in get_collectors().items() if (state := collector.export_state()) is not None}
+
+
+def _import_snapshots(state):
+    for name, collector_state in state.items():
+        if name in get_clusters():
+            get_collector(name).import_state(collector_state)
+
+
+register_collector(_collect_snapshot_metrics)
+
+if config.PERSIST_SNAPSHOT:
+    register_state("snapshots", _export_snapshots, _import_snapshots)
@@ -0,0 +1,207 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+import config
+from cluster.collector import get_collector
+from cluster.registry import get_cluster, get_clusters
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+COLUMNS = ("gpu_total", "gpu_used", "gpu_lp", "cpu_used", "mem_used", "pending")
+# table -> (bucket seconds, retention seconds). Raw samples are kept as they are, rollups as sums of value * seconds
+TIERS = {
+    "raw": (None, 48 * 3600),
+    "rollup_5m": (5 * 60, 30 * 24 * 3600),
+    "rollup_1h": (3600, None),
+}
+
+
+def get_job_allocation(job_info):
+    """(cpus, memory in MB) allocated to a job over all its nodes, memory is requested per cpu or per node"""
+    cpus = sum(node_cpus for _, node_cpus in job_info.cpus_allocated)
+    if job_info.mem_per_cpu:
+        mem = (job_info.min_memory_cpu or 0) * cpus
+    else:
+        mem = (job_info.min_memory_node or 0) * len(job_info.cpus_allocated)
+    return cpus, mem
+
+
+def reduce_snapshot(snapshot):
+    """
+    (kind, name) -> (gpu_total, gpu_used, gpu_lp, cpu_used, mem_used, pending) for every gpu type, partition and user.
+    Memory is in MB. Users and partitions have the gpus, cpus and memory of their running jobs and their pending jobs,
+    gpu types no pending jobs.
+    """
+    series = defaultdict(lambda: [0] * len(COLUMNS))
+    for node_type, node_dict in snapshot.nodes.items():
+        values = series["gpu", node_type]
+        for node_name, node_info in node_dict.items():
+            values[0] += node_info.gpu_total
+            values[1] += node_info.gpu_used
+            values[2] += snapshot.node_lp[node_name].gpu
+            values[3] += node_info.cpu_used
+            values[4] += snapshot.node_dict[node_name]["alloc_mem"]
+    for job_info in snapshot.job_dict.values():
+        user, partition = series["user", snapshot.user_name(job_info.user_id)], series["partition", job_info.partition]
+        if job_info.job_state == "RUNNING":
+            cpus, mem = get_job_allocation(job_info)
+            for values in (user, partition):
+                values[1] += job_info.num_gpus
+                values[2] += job_info.num_gpus if job_info.partition == snapshot.cluster.lp_partition else 0
+                values[3] += cpus
+                values[4] += mem
+        elif job_info.job_state == "PENDING":
+            user[5] += 1
+            partition[5] += 1
+    return dict(series)
+
+
+class ClusterHistory:
+    """
+    Utilization time series of one cluster in SQLite, one series per gpu type, partition and user.
+
+    A sample is recorded at most every `interval` seconds. Every sample also goes into 5 minute and hourly rollups,
+    which store sums of value * seconds covered so averages and gpu-hours stay exact across gaps. Raw samples are
+    kept 48 hours, 5 minute rollups 30 days and hourly rollups forever. Queries read the finest tier that covers
+    the window, so they never scan more than a few thousand rows per series.
+    """
+
+    def __init__(self, path=config.HISTORY_FILE, interval=config.HISTORY_INTERVAL, cluster=None):
+        self.path = path
+        self.cluster = cluster or get_cluster().name
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._db = None
+        self._series_ids = {}
+        self._last_sample = None
+        self._last_cleanup = 0.
+
+    def _connect(self):
+        if self._db is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS series (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, name TEXT NOT NULL, UNIQUE (kind, name))")
+            for table in TIERS:
+                self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} (series INTEGER NOT NULL, ts INTEGER NOT NULL, seconds REAL NOT NULL, "
+                                 f"{', '.join(f'{column} REAL NOT NULL' for column in COLUMNS)}, PRIMARY KEY (series, ts)) WITHOUT ROWID")
+            self._series_ids = {(kind, name): series_id for series_id, kind, name in self._db.execute("SELECT id, kind, name FROM series")}
+            row = self._db.execute("SELECT MAX(ts) FROM raw").fetchone()
+            self._last_sample = row[0]
+        return self._db
+
+    def _series_id(self, kind, name):
+        if (series_id := self._series_ids.get((kind, name))) is None:
+            series_id = self._db.execute("INSERT INTO series (kind, name) VALUES (?, ?)", (kind, name)).lastrowid
+            self._series_ids[kind, name] = series_id
+        return series_id
+
+    def record(self, snapshot):
+        """Adds a sample of `snapshot` unless the last one is less than `interval` seconds older."""
+        ts = int(snapshot.created_at)
+        with self._lock:
+            db = self._connect()
+            if self._last_sample is not None and ts - self._last_sample < self.interval:
+                return False
+            # a sample stands for the time since the previous one, capped so that downtime is not counted
+            seconds = min(ts - self._last_sample, 2 * self.interval) if self._last_sample is not None else self.interval
+            rows = [(self._series_id(kind, name), values) for (kind, name), values in reduce_snapshot(snapshot).items()]
+            placeholders = ", ".join("?" * (len(COLUMNS) + 3))
+            updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in ("seconds", *COLUMNS))
+            db.execute("BEGIN")
+            try:
+                db.executemany(f"INSERT OR REPLACE INTO raw VALUES ({placeholders})", [(series_id, ts, seconds, *values) for series_id, values in rows])
+                for table, (bucket, _) in TIERS.items():
+                    if bucket is not None:
+                        db.executemany(f"INSERT INTO {table} VALUES ({placeholders}) ON CONFLICT (series, ts) DO UPDATE SET {updates}",
+                                       [(series_id, ts - ts % bucket, seconds, *(value * seconds for value in values)) for series_id, values in rows])
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            self._last_sample = ts
+            if ts - self._last_cleanup > 3600:
+                self._cleanup(ts)
+            return True
+
+    def _cleanup(self, now):
+        for table, (_, retention) in TIERS.items():
+            if retention is not None:
+                self._db.execute(f"DELETE FROM {table} WHERE ts < ?", (now - retention,))
+        self._last_cleanup = now
+
+    @staticmethod
+    def _tier(window):
+        for table, (_, retention) in TIERS.items():
+            if retention is None or window <= retention:
+                return table
+
+    @staticmethod
+    def _weighted(table, column):
+        return f"{column} * seconds" if table == "raw" else column
+
+    def trend(self, kind, window, points=24, now=None):
+        """
+        name -> list of `points` (bucket start, average of every column or None) over the last `window` seconds
+        for every series of `kind`.
+        """
+        now = int(time.time() if now is None else now)
+        step = max(1, window // points)
+        start = now - points * step
+        table = self._tier(window)
+        averages = ", ".join(f"SUM({self._weighted(table, column)}) / SUM(seconds)" for column in COLUMNS)
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT s.name, (t.ts - ?) / ?, {averages} FROM {table} t JOIN series s ON s.id = t.series "
+                f"WHERE s.kind = ? AND t.ts >= ? GROUP BY t.series, (t.ts - ?) / ?",
+                (start, step, kind, start, start, step)).fetchall()
+        trends = defaultdict(lambda: [(start + i * step, None) for i in range(points)])
+        for name, i, *values in rows:
+            if 0 <= i < points:
+                trends[name][i] = (start + i * step, dict(zip(COLUMNS, values)))
+        return dict(trends)
+
+    def gpu_hours(self, window, kind="user", limit=None, now=None):
+        """(name, gpu-hours, low priority gpu-hours) of every series of `kind` over the last `window` seconds, most first"""
+        now = int(time.time() if now is None else now)
+        table = self._tier(window)
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT s.name, SUM({self._weighted(table, 'gpu_used')}) / 3600, SUM({self._weighted(table, 'gpu_lp')}) / 3600 "
+                f"FROM {table} t JOIN series s ON s.id = t.series WHERE s.kind = ? AND t.ts >= ? GROUP BY t.series ORDER BY 2 DESC"
+                + (" LIMIT ?" if limit else ""),
+                (kind, now - window, *([limit] if limit else []))).fetchall()
+        return [row for row in rows if row[1] > 0]
+
+    def on_snapshot(self, previous, snapshot):
+        try:
+            self.record(snapshot)
+        except sqlite3.Error:
+            logger.exception("Failed to record cluster history")
+
+    def start(self):
+        get_collector(self.cluster).add_listener(self.on_snapshot)
+
+
+def _history_path(name):
+    """config.HISTORY_FILE for the default cluster, cache/history.sqlite -> cache/history-<name>.sqlite for the others"""
+    if name == get_cluster().name:
+        return config.HISTORY_FILE
+    root, ext = os.path.splitext(config.HISTORY_FILE)
+    return f"{root}-{name}{ext}"
+
+
+# cluster name -> ClusterHistory, every cluster has its own file
+cluster_histories = {name: ClusterHistory(_history_path(name), cluster=name) for name in get_clusters()}
+cluster_history = cluster_histories[get_cluster().name]
+
+
+def start_cluster_histories():
+    for history in cluster_histories.values():
+        history.start()
@@ -0,0 +1,60 @@
+import re
+import sys
+
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+GPU_TYPE_RE = re.compile(r"gres/gpu:([^=,]+)=")  # typed gpu request, e.g. gres/gpu:a40=2
+
+
+def get_num_gpus(tres_req_str):
+    return sum([int(req_str.split("=")[-1]) for req_str in tres_req_str.split(",") if req_str.startswith("gres/gpu")])
+
+
+def get_gpu_type(tres_req_str):
+    """gpu type the job asked for, None if any type does"""
+    match = GPU_TYPE_RE.search(tres_req_str)
+    return match.group(1) if match else None
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class JobRecord:
+    """
+    The fields of a pyslurm job dict the bot reads, out of ~100. `tres_req_str` is reduced to `num_gpus` and `gpu_type`,
+    `cpus_allocated` is a tuple of (node name, cpus) pairs, repeated strings (states, partitions, hosts, ...) are interned.
+    """
+    __slots__ = ("job_state", "partition", "user_id", "num_gpus", "gpu_type", "batch_host", "batch_flag", "run_time", "run_time_str",
+                 "time_limit_str", "start_time", "end_time", "priority", "name", "state_reason", "cpus_allocated",
+                 "mem_per_cpu", "min_memory_cpu", "mem_per_node", "min_memory_node")
+    _interned = ("job_state", "partition", "gpu_type", "batch_host", "time_limit_str", "state_reason")
+
+    def __init__(self, **fields):
+        for field in self.__slots__:
+            setattr(self, field, _intern(fields[field]) if field in self._interned else fields[field])
+        self.cpus_allocated = tuple((_intern(node_name), cpus) for node_name, cpus in self.cpus_allocated)
+
+    @classmethod
+    def from_pyslurm(cls, job_info):
+        return cls(num_gpus=get_num_gpus(job_info["tres_req_str"]), gpu_type=get_gpu_type(job_info["tres_req_str"]),
+                   cpus_allocated=job_info["cpus_allocated"].items(),
+                   **{field: job_info[field] for field in cls.__slots__ if field not in ("num_gpus", "gpu_type", "cpus_allocated")})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __eq__(self, other):
+        return isinstance(other, JobRecord) and all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"JobRecord({self.job_state}, {self.partition}, uid={self.user_id}, gpus={self.num_gpus}, host={self.batch_host})"
+
+
+def project_job_dict(raw_job_dict):
+    """pyslurm job dict -> job id -> JobRecord"""
+    return {job_id: JobRecord.from_pyslurm(job_info) for job_id, job_info in raw_job_dict.items()}
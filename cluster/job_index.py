@@ -0,0 +1,137 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+
+import config
+from utils.cache import cache_for_n_seconds
+
+# sort name -> (label, key of a JobEntry), ties are broken by job id so that every key is unique
+SORTS = {
+    "priority": ("Priority", lambda entry: (entry.part, -entry.job_info.priority)),
+    "gpus": ("Most GPUs", lambda entry: (-entry.job_info.num_gpus, entry.part)),
+    "user": ("User", lambda entry: (entry.user, entry.part)),
+    "job_id": ("Job ID", lambda entry: ()),
+}
+FILTERS = ("partition", "user", "gpu")
+INDEXED = ("user", "state", "partition", "gpu", "node")  # secondary indexes of every job, gpu types in lower case
+
+
+class JobEntry:
+    """A job of the index with the values it is filtered and sorted on"""
+    __slots__ = ("job_id", "job_info", "user", "gpu", "part", "nodes")
+
+    def __init__(self, job_id, job_info, user, gpu):
+        self.job_id = job_id
+        self.job_info = job_info
+        self.user = user
+        self.gpu = gpu
+        self.part = job_info.partition
+        self.nodes = {node_name for node_name, _ in job_info.cpus_allocated}
+        if job_info.batch_host is not None:
+            self.nodes.add(job_info.batch_host)
+
+
+class JobView:
+    """
+    Jobs of one state matching a set of filters, sorted. Pages are addressed by keyset cursors, the sort key of the
+    job a page starts after (or ends before), so paging stays in place when jobs come and go between two clicks.
+    """
+
+    def __init__(self, entries, sort):
+        sort_key = SORTS[sort][1]
+        keyed = sorted(((*sort_key(entry), entry.job_id), entry) for entry in entries)
+        self.keys = [key for key, _ in keyed]
+        self.entries = [entry for _, entry in keyed]
+        self.partitions = Counter(entry.part for entry in self.entries)
+        self.reasons = Counter(entry.job_info.state_reason for entry in self.entries)
+        self.num_gpus = sum(entry.job_info.num_gpus for entry in self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def page(self, size, after=None, before=None):
+        """(entries, index of the first one) of the page after the cursor `after`, before `before`, or the first page"""
+        if before is not None:
+            end = bisect_left(self.keys, tuple(before))
+            start = max(0, end - size)
+            end = min(len(self.entries), start + size)
+        else:
+            start = bisect_right(self.keys, tuple(after)) if after is not None else 0
+            end = min(len(self.entries), start + size)
+        return self.entries[start:end], start
+
+    def cursor(self, i):
+        """The cursor of the `i`th job, JSON serializable"""
+        return list(self.keys[i])
+
+
+def select(by, everything, values, predicate=None):
+    """
+    Items in every bucket `by[name][value]` of `values` and matching `predicate`. Buckets are dicts keyed like
+    `everything`, only the smallest one is iterated and the others are looked up, so a query costs O(matches of its
+    most selective filter) rather than O(items). Without `values`, every item is checked against `predicate`.
+    """
+    buckets = sorted((by[name].get(value, {}) for name, value in values.items()), key=len)
+    candidates, others = (buckets[0], buckets[1:]) if buckets else (everything, [])
+    return [item for key, item in candidates.items()
+            if all(key in bucket for bucket in others) and (predicate is None or predicate(item))]
+
+
+class JobIndex:
+    """
+    Jobs of a snapshot (or just `job_dict`) with their user and gpu type resolved once, in the secondary indexes
+    `by[name][value] -> job id -> JobEntry` of `INDEXED` for `select`. Filtered and sorted views of the gpu jobs are
+    built on first use and kept for the lifetime of the index, i.e. of the snapshot.
+    """
+
+    def __init__(self, snapshot, job_dict=None):
+        self.snapshot = snapshot
+        self.entries = {}
+        self.by = {name: defaultdict(dict) for name in INDEXED}
+        self._by_state = {}
+        node2gpu, cpu_partitions = snapshot.node2gpu, snapshot.cluster.cpu_partitions
+        by_user, by_state, by_partition, by_gpu, by_node = (self.by[name] for name in INDEXED)
+        for job_id, job_info in (snapshot.job_dict if job_dict is None else job_dict).items():
+            gpu = node2gpu[job_info.batch_host][0] if job_info.batch_host in node2gpu else job_info.gpu_type
+            entry = JobEntry(job_id, job_info, snapshot.user_name(job_info.user_id), gpu)
+            self.entries[job_id] = entry
+            by_user[entry.user][job_id] = entry
+            by_state[job_info.job_state][job_id] = entry
+            by_partition[entry.part][job_id] = entry
+            if gpu:
+                by_gpu[gpu.lower()][job_id] = entry
+            for node_name in entry.nodes:
+                by_node[node_name][job_id] = entry
+            if job_info.partition not in cpu_partitions:
+                self._by_state.setdefault(job_info.job_state, []).append(entry)
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def options(self, state):
+        """filter -> values present among the jobs of `state`, the most frequent first"""
+        entries = self._by_state.get(state, [])
+        return {
+            "partition": [value for value, _ in Counter(entry.part for entry in entries).most_common()],
+            "user": [value for value, _ in Counter(entry.user for entry in entries).most_common()],
+            "gpu": [value for value, _ in Counter(entry.gpu for entry in entries if entry.gpu).most_common()],
+        }
+
+    def view(self, state, sort="priority", partition=None, user=None, gpu=None):
+        key = (state, sort if sort in SORTS else "priority", partition, user, gpu)
+        if (view := self._views.get(key)) is None:
+            entries = [entry for entry in self._by_state.get(state, [])
+                       if (partition is None or entry.part == partition) and (user is None or entry.user == user) and (gpu is None or entry.gpu == gpu)]
+            view = JobView(entries, key[1])
+            with self._lock:
+                self._views = {**self._views, key: view} if len(self._views) < 64 else {key: view}
+        return view
+
+
+def _snapshot_key(snapshot):
+    return snapshot.version
+
+
+@cache_for_n_seconds(seconds=config.RENDER_CACHE_TTL, maxsize=2 * len(config.CLUSTERS), key=_snapshot_key)
+def get_job_index(snapshot):
+    """Index of every job of `snapshot`, built once per snapshot version"""
+    return JobIndex(snapshot)
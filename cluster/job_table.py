@@ -0,0 +1,65 @@
+import threading
+import time
+
+from cluster.job import JobRecord
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# slurmctld keeps finished jobs around for MinJobAge seconds, they have left the queue as far as the bot is concerned
+FINISHED_JOB_STATES = frozenset({"COMPLETED", "CANCELLED", "FAILED", "TIMEOUT", "NODE_FAIL", "PREEMPTED", "BOOT_FAIL", "DEADLINE", "OUT_OF_MEMORY"})
+
+
+class JobTable:
+    """
+    The job table of slurmctld as JobRecords, without the finished jobs.
+
+    Every load fetches and converts the whole table, pyslurm's `job().get()` takes no "changed since" time. The table
+    keeps one `pyslurm.job()` around and compares the update time read from it after `get()` with the one of the
+    previous load: when it did not move, the previous records are returned instead of projecting every job again.
+
+    `load()` returns a new dict whenever the table changed, a dict it returned is never modified afterwards.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._job = None
+        self.last_update = None
+        self.jobs = {}
+        self.stats = dict(loads=0, unchanged=0, load_time=0.)
+
+    def _get(self):
+        """Loads the job table, returns (pyslurm job dict, its update time). `lastUpdate()` is only set by `get()`."""
+        if self._job is None:
+            import pyslurm  # on first use, see query_slurm.py
+            self._job = pyslurm.job()
+        raw_job_dict = self._job.get()
+        return raw_job_dict, self._job.lastUpdate() if hasattr(self._job, "lastUpdate") else None
+
+    def load(self):
+        with self._lock:
+            start = time.time()
+            self.stats["loads"] += 1
+            raw_job_dict, last_update = self._get()
+            if last_update is not None and last_update == self.last_update:
+                self.stats["unchanged"] += 1
+            else:
+                self.jobs = {job_id: JobRecord.from_pyslurm(job_info) for job_id, job_info in raw_job_dict.items()
+                             if job_info["job_state"] not in FINISHED_JOB_STATES}
+                self.last_update = last_update
+            self.stats["load_time"] += time.time() - start
+            return self.jobs
+
+    def reset(self):
+        """Drops the records and the pyslurm handle, the next load converts everything again."""
+        with self._lock:
+            self._job = None
+            self.last_update = None
+            self.jobs = {}
+
+
+_job_table = JobTable()
+
+
+def get_job_table():
+    return _job_table
@@ -0,0 +1,82 @@
+"""
+Polls a Slurm cluster with its own slurm.conf from a worker process.
+
+pyslurm reads slurm.conf once when it is imported, so a cluster other than the one of this host's slurm.conf is
+polled by `python -m cluster.poller` started with SLURM_CONF pointing at that cluster's slurm.conf. The worker
+keeps its own job store and caches across polls. Every line written to its stdin asks for one poll, answered with
+one line of JSON on stdout: {"node_dict": ..., "job_dict": {job id: JobRecord.to_dict()}}.
+"""
+import json
+import os
+import select
+import subprocess
+import sys
+import threading
+
+import config
+from cluster.job import JobRecord
+from cluster.query_slurm import get_slum_job_dict, get_slum_node_dict
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.abspath(config.__file__))
+
+
+class SlurmWorker:
+    """Parent side: one worker process per remote cluster, started on first use and restarted when it dies or hangs."""
+
+    def __init__(self, cluster, timeout=config.CLUSTER_POLL_TIMEOUT):
+        self.cluster = cluster
+        self.timeout = timeout
+        self._process = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        env = {**os.environ, "SLURM_CONF": self.cluster.slurm_conf}
+        self._process = subprocess.Popen([sys.executable, "-m", "cluster.poller"], cwd=ROOT_DIR, env=env,
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        logger.info(f"Started slurm worker {self._process.pid} for cluster {self.cluster.name} ({self.cluster.slurm_conf})")
+
+    def stop(self):
+        with self._lock:
+            self._kill()
+
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def poll(self):
+        """(node_dict, job_dict) of the cluster, raises TimeoutError if the worker does not answer within `timeout` seconds"""
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                self._start()
+            try:
+                self._process.stdin.write("poll\n")
+                self._process.stdin.flush()
+                ready, _, _ = select.select([self._process.stdout], [], [], self.timeout)
+                if not ready:
+                    self._kill()
+                    raise TimeoutError(f"Slurm worker of cluster {self.cluster.name} did not answer in {self.timeout}s")
+                if not (line := self._process.stdout.readline()):
+                    self._kill()
+                    raise ConnectionError(f"Slurm worker of cluster {self.cluster.name} exited")
+            except BrokenPipeError:
+                self._kill()
+                raise
+        result = json.loads(line)
+        return result["node_dict"], {int(job_id): JobRecord(**job_info) for job_id, job_info in result["job_dict"].items()}
+
+
+def main():
+    for _ in sys.stdin:
+        job_dict = get_slum_job_dict()
+        result = {"node_dict": get_slum_node_dict(), "job_dict": {job_id: job_info.to_dict() for job_id, job_info in job_dict.items()}}
+        sys.stdout.write(json.dumps(result, separators=(",", ":")) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
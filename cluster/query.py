@@ -0,0 +1,175 @@
+import re
+from collections import defaultdict
+
+import config
+from cluster.job_index import get_job_index, select
+from cluster.node import _abbreviate_state
+from utils.cache import cache_for_n_seconds
+
+FIELD_ALIASES = {
+    "user": "user", "u": "user",
+    "state": "state", "s": "state",
+    "partition": "partition", "part": "partition", "p": "partition",
+    "gpu": "gpu", "type": "gpu", "g": "gpu",
+    "node": "node", "host": "node", "n": "node",
+}
+JOB_STATES = {
+    "pending": "PENDING", "pd": "PENDING", "running": "RUNNING", "r": "RUNNING", "completing": "COMPLETING", "cg": "COMPLETING",
+    "suspended": "SUSPENDED", "s": "SUSPENDED", "preempted": "PREEMPTED", "pr": "PREEMPTED",
+}
+# as abbreviated in NodeRecord.state
+NODE_STATES = {"idle": "idl", "mixed": "mix", "mix": "mix", "allocated": "aloc", "alloc": "aloc", "drain": "drn", "drained": "drn", "down": "dow"}
+TERM_RE = re.compile(r"^([A-Za-z_]+)(>=|>|:|=)(\S+)$")
+DURATION_RE = re.compile(r"^(\d+)([smhdw]?)$")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 24 * 3600, "w": 7 * 24 * 3600, "": 3600}  # hours if no unit
+GRAMMAR = {
+    "jobs": "`user:<name>` (or `me`), `state:pending|running`, `partition:<name>`, `gpu:<type>`, `node:<name>`, `gpus>=<n>`, "
+            "`runtime><n>[s|m|h|d]`, `<cluster>`. Bare words are matched against states, partitions, gpu types, nodes and users, "
+            "e.g. `/jobs pending a6000 ddp-4way`.",
+    "nodes": "`user:<name>` (or `me`), `state:idle|mix|alloc|drain`, `partition:<name>`, `gpu:<type>`, `node:<name>`, `free>=<n>`, "
+             "`<cluster>`. Bare words are matched like fields, e.g. `/nodes rtx8k free>=2`.",
+}
+
+
+class Query:
+    """Filters of a `/jobs` or `/nodes` command: indexed `values` (field -> value) plus `min_gpus` and `min_runtime` (seconds, inclusive)"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.values = {}
+        self.min_gpus = 0  # gpus of a job, free gpus of a node
+        self.min_runtime = 0
+        self.runtime_op = ">="  # as typed, for __str__
+        self.errors = []
+
+    def __str__(self):
+        terms = [f"{name}:{value.lower() if name == 'state' else value}" for name, value in self.values.items()]
+        if self.min_gpus:
+            terms.append(f"{'gpus' if self.kind == 'jobs' else 'free'}>={self.min_gpus}")
+        if self.min_runtime:
+            op, seconds = self.runtime_op, self.min_runtime - (self.runtime_op == ">")
+            unit = next(unit for unit in "wdhms" if seconds % DURATION_UNITS[unit] == 0)
+            terms.append(f"runtime{op}{seconds // DURATION_UNITS[unit]}{unit}")
+        return " ".join(terms) or "everything"
+
+
+class NodeEntry:
+    """A gpu node of the index, with the users of the jobs running on it"""
+    __slots__ = ("name", "record", "users")
+
+    def __init__(self, name, record, users):
+        self.name = name
+        self.record = record
+        self.users = users
+
+
+class NodeIndex:
+    """Gpu nodes of a snapshot in the secondary indexes `by[name][value] -> node name -> NodeEntry`, for `select`"""
+
+    def __init__(self, snapshot, job_index):
+        self.snapshot = snapshot
+        self.entries = {}
+        self.by = {name: defaultdict(dict) for name in ("user", "state", "partition", "gpu", "node")}
+        for gpu_type, node_dict in snapshot.nodes.items():
+            for node_name, record in node_dict.items():
+                users = sorted({entry.user for entry in job_index.by["node"].get(node_name, {}).values() if entry.job_info.job_state == "RUNNING"})
+                entry = NodeEntry(node_name, record, users)
+                self.entries[node_name] = entry
+                self.by["node"][node_name][node_name] = entry
+                self.by["gpu"][gpu_type.lower()][node_name] = entry
+                # every flag of e.g. MIXED+DRAIN, from slurm's state as the shown one is cut to 8 characters
+                for state in snapshot.node_dict[node_name]["state"].split("+"):
+                    self.by["state"][_abbreviate_state(state)][node_name] = entry
+                for partition in snapshot.node_dict[node_name]["partitions"]:
+                    self.by["partition"][partition][node_name] = entry
+                for user in users:
+                    self.by["user"][user][node_name] = entry
+
+
+def _snapshot_key(snapshot):
+    return snapshot.version
+
+
+@cache_for_n_seconds(seconds=config.RENDER_CACHE_TTL, maxsize=2 * len(config.CLUSTERS), key=_snapshot_key)
+def get_node_index(snapshot):
+    """Index of every gpu node of `snapshot`, built once per snapshot version"""
+    return NodeIndex(snapshot, get_job_index(snapshot))
+
+
+def parse_duration(text):
+    """"90s", "90m", "2h", "3d", "4" (hours) -> seconds, None if it is not a duration"""
+    if match := DURATION_RE.match(text):
+        return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+    return None
+
+
+def _guess_field(word, index, kind):
+    """Field of a bare word, from the states and the values present in the indexes (gpu types in lower case)"""
+    if word.lower() in (JOB_STATES if kind == "jobs" else NODE_STATES):
+        return "state"
+    for name in ("partition", "gpu", "node", "user"):
+        if (word.lower() if name == "gpu" else word) in index.by[name]:
+            return name
+    return None
+
+
+def parse_query(text, kind, index, unix_user=None, ignore=()):
+    """
+    `text` of `/jobs` or `/nodes` -> Query, with the terms that could not be understood in `errors`.
+    `index` is the JobIndex or NodeIndex the query runs on, used to resolve bare words. Words in `ignore` (the
+    cluster name) are skipped. Field names, states and gpu types are case insensitive, users, partitions and nodes
+    are matched as they are in slurm.
+    """
+    query = Query(kind)
+    for word in (text or "").split():
+        if word in ignore:
+            continue
+        if word.lower() == "me":
+            name, op, value = "user", ":", unix_user
+        elif match := TERM_RE.match(word):
+            name, op, value = match.groups()
+            name = name.lower()
+        else:
+            name, op, value = _guess_field(word, index, kind), ":", word
+            if name is None:
+                query.errors.append(f"`{word}` is not a state, partition, gpu type, node or user")
+                continue
+
+        if name in ("gpus", "free") and (kind == "jobs") == (name == "gpus") and value.isdigit():
+            query.min_gpus = int(value) + (op == ">")
+        elif name == "runtime" and kind == "jobs" and op in (">", ">=") and (seconds := parse_duration(value)) is not None:
+            query.min_runtime = seconds + (op == ">")  # whole seconds, like gpus>
+            query.runtime_op = op
+        elif FIELD_ALIASES.get(name) and op in (":", "=") and value:
+            name = FIELD_ALIASES[name]
+            if name == "state":
+                states = JOB_STATES if kind == "jobs" else NODE_STATES
+                if value.lower() not in states:
+                    query.errors.append(f"`{value}` is not a {kind[:-1]} state ({', '.join(sorted(set(states.values()), key=str.lower))})")
+                    continue
+                value = states[value.lower()]
+            elif name == "gpu":
+                value = value.lower()
+            query.values[name] = value
+        else:
+            query.errors.append(f"`{word}` is not a filter of `/{kind}`")
+    return query
+
+
+def find_jobs(snapshot, query):
+    """JobEntries matching `query`, by state, partition, priority and job id"""
+    index = get_job_index(snapshot)
+    predicate = None
+    if query.min_gpus or query.min_runtime:
+        def predicate(entry):
+            return entry.job_info.num_gpus >= query.min_gpus and entry.job_info.run_time >= query.min_runtime
+    entries = select(index.by, index.entries, query.values, predicate)
+    return sorted(entries, key=lambda entry: (entry.job_info.job_state, entry.part, -entry.job_info.priority, entry.job_id))
+
+
+def find_nodes(snapshot, query):
+    """NodeEntries matching `query`, by gpu type and name"""
+    index = get_node_index(snapshot)
+    predicate = (lambda entry: entry.record.gpu_free >= query.min_gpus) if query.min_gpus else None
+    entries = select(index.by, index.entries, query.values, predicate)
+    return sorted(entries, key=lambda entry: (entry.record.gpu_type, entry.name))
@@ -1,16 +1,25 @@
-import pyslurm
-
+from cluster.job import JobRecord
+from cluster.job_table import FINISHED_JOB_STATES, get_job_table
 from utils.log import get_logger
-from utils.utils import cache_for_n_seconds
+from utils.cache import cache_for_n_seconds
+from utils.metrics import Counter, Histogram
 
 logger = get_logger(__name__)
 
+SLURM_CALL_SECONDS = Histogram("susbot_slurm_call_seconds", "Latency of pyslurm calls to slurmctld", ["call"])
+SLURM_CALL_ERRORS = Counter("susbot_slurm_call_errors", "pyslurm calls that failed", ["call"])
+
+# pyslurm is imported by the first query instead of at startup, it loads libslurm and reads slurm.conf
+
 
 @cache_for_n_seconds(seconds=2)
 def get_slum_node_dict():
+    import pyslurm
     try:
-        return pyslurm.node().get()
+        with SLURM_CALL_SECONDS.labels("node").time():
+            return pyslurm.node().get()
     except ValueError as e:
+        SLURM_CALL_ERRORS.labels("node").inc()
         logger.error(f"Error - {e.args[0]}")
         return {}
 
@@ -18,16 +27,36 @@ def get_slum_node_dict():
 @cache_for_n_seconds(seconds=2)
 def get_slum_job_dict():
     try:
-        return pyslurm.job().get()
+        with SLURM_CALL_SECONDS.labels("job").time():
+            return get_job_table().load()
+    except ValueError as e:
+        SLURM_CALL_ERRORS.labels("job").inc()
+        logger.error(f"Error - {e.args[0]}")
+        get_job_table().reset()
+        return {}
+
+
+@cache_for_n_seconds(seconds=2)
+def get_slum_user_job_dict(uid):
+    """Jobs of one user, filtered by slurmctld (slurm_load_job_user) instead of loading every job"""
+    import pyslurm
+    try:
+        with SLURM_CALL_SECONDS.labels("job_user").time():
+            user_job_dict = pyslurm.job().find_user(uid)
+        return {job_id: JobRecord.from_pyslurm(job_info) for job_id, job_info in user_job_dict.items() if job_info["job_state"] not in FINISHED_JOB_STATES}
     except ValueError as e:
+        SLURM_CALL_ERRORS.labels("job_user").inc()
         logger.error(f"Error - {e.args[0]}")
         return {}
 
 
 @cache_for_n_seconds(seconds=2)
 def get_slum_statistics_dict():
+    import pyslurm
     try:
-        return pyslurm.statistics().get()
+        with SLURM_CALL_SECONDS.labels("statistics").time():
+            return pyslurm.statistics().get()
     except ValueError as e:
+        SLURM_CALL_ERRORS.labels("statistics").inc()
         logger.error(f"Error - {e.args[0]}")
         return {}
@@ -0,0 +1,49 @@
+import config
+
+
+class ClusterConfig:
+    """Settings of one Slurm cluster, see `config.CLUSTERS`."""
+
+    def __init__(self, name, slurm_conf=None, gpu_display_order=(config.NEW_GPU_DISPLAY_ORDER, config.OLD_GPU_DISPLAY_ORDER),
+                 display_partitions=(), lp_partition="low-prio-gpu", cpu_partitions=("compute",), user_summaries=()):
+        self.name = name
+        self.slurm_conf = slurm_conf
+        self.new_gpus, self.old_gpus = (list(gpus) for gpus in gpu_display_order)
+        self.gpu_display_order = self.new_gpus + self.old_gpus
+        self.display_partitions = [tuple(pair) for pair in display_partitions]
+        self.lp_partition = lp_partition
+        self.cpu_partitions = list(cpu_partitions)
+        self.user_summaries = [(title, list(ignore_partition), limit) for title, ignore_partition, limit in user_summaries]
+
+    @property
+    def remote(self):
+        """True if the cluster is polled from a worker process, with its own slurm.conf"""
+        return self.slurm_conf is not None
+
+    def __repr__(self):
+        return f"ClusterConfig({self.name!r}, slurm_conf={self.slurm_conf!r})"
+
+
+_clusters = None
+
+
+def get_clusters():
+    """cluster name -> ClusterConfig of every cluster in `config.CLUSTERS`, the default one first"""
+    global _clusters
+    if _clusters is None:
+        _clusters = {name: ClusterConfig(name, **settings) for name, settings in config.CLUSTERS.items()}
+        if sum(1 for cluster in _clusters.values() if not cluster.remote) > 1:
+            raise ValueError("At most one cluster in config.CLUSTERS can be polled in process (slurm_conf=None), "
+                             "pyslurm is bound to one slurm.conf per process")
+    return _clusters
+
+
+def get_cluster(name=None):
+    """ClusterConfig named `name`, the default cluster if None"""
+    clusters = get_clusters()
+    return clusters[name] if name is not None else next(iter(clusters.values()))
+
+
+def get_local_cluster():
+    """ClusterConfig of the cluster polled in this process, None if every cluster has its own slurm.conf"""
+    return next((cluster for cluster in get_clusters().values() if not cluster.remote), None)
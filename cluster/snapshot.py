@@ -0,0 +1,96 @@
+import itertools
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import config
+from cluster.aggregate import UserGpuSummary
+from cluster.node import extract_useful_node_info_dict, get_lp_node_info, get_node_lp_usage
+from cluster.query_slurm import get_slum_node_dict, get_slum_job_dict, get_slum_user_job_dict
+from cluster.registry import get_cluster, get_local_cluster
+from utils.cache import cache_for_n_seconds
+from utils.log import get_logger
+from utils.passwd import get_passwd_index
+
+logger = get_logger(__name__)
+
+_versions = itertools.count(1)
+
+
+class ClusterSnapshot:
+    """
+    Everything the block builders need, derived once from a pair of pyslurm node/job dicts.
+
+    Attributes:
+        version (int): increases with every snapshot built in this process
+        cluster (ClusterConfig): the cluster the dicts come from
+        node_dict (dict): raw pyslurm node dict
+        job_dict (dict): job id -> JobRecord
+        lp_node_info (dict): node name -> low-priority cpu/gpu/mem usage
+        nodes (dict): gpu type -> node name -> NodeRecord, shared with other snapshots while the node is unchanged
+        node_lp (dict): node name -> NodeLpUsage
+        node2gpu (dict): node name -> (gpu type, gpu memory)
+        gpu2gmem (dict): gpu type -> gpu memory
+        uid2user (dict): uid -> unix user name for every uid present in job_dict
+        jobs_by_user (dict): unix user name -> job id -> job info
+        user_gpu_summary (UserGpuSummary): running gpus grouped by partition and user
+    """
+
+    def __init__(self, node_dict, job_dict, created_at=None, cluster=None):
+        self.version = next(_versions)
+        self.cluster = cluster or get_cluster()
+        self.created_at = time.time() if created_at is None else created_at
+        self.node_dict = node_dict or {}
+        self.job_dict = job_dict or {}
+        self.lp_node_info = get_lp_node_info(self.job_dict, self.cluster.lp_partition)
+        self.nodes = extract_useful_node_info_dict(self.node_dict, self.cluster)
+        self.node_lp = get_node_lp_usage(self.nodes, self.lp_node_info)
+        self.node2gpu = {node_name: (node_type, node_info.gmem) for node_type, node_dict in self.nodes.items() for node_name, node_info in node_dict.items()}
+        self.gpu2gmem = {node_type: node_info.gmem for node_type, node_dict in self.nodes.items() for node_info in node_dict.values()}
+        passwd_index = get_passwd_index()
+        self.uid2user = {uid: passwd_index.name(uid) for uid in {job_info.user_id for job_info in self.job_dict.values()}}
+        self.jobs_by_user = defaultdict(dict)
+        for job_id, job_info in self.job_dict.items():
+            self.jobs_by_user[self.uid2user[job_info.user_id]][job_id] = job_info
+        self.jobs_by_user = dict(self.jobs_by_user)
+        self.user_gpu_summary = UserGpuSummary(self)
+
+    def user_name(self, uid):
+        return self.uid2user[uid] if uid in self.uid2user else get_passwd_index().name(uid)
+
+    @property
+    def age(self):
+        return time.time() - self.created_at
+
+    def age_str(self):
+        age = int(self.age)
+        return f"{age}s" if age < 60 else f"{age // 60}m {age % 60}s"
+
+    def updated_str(self):
+        return f"{datetime.fromtimestamp(self.created_at).strftime('%m/%d/%Y, %H:%M:%S')} ({self.age_str()} ago)"
+
+    def updated_date(self, format="{date_short} {time_secs} ({ago})"):
+        """
+        The time of the snapshot as a Slack date token, shown in the reader's time zone with an age that Slack keeps
+        current. Unlike `updated_str` it is the same text for every render of the snapshot, see PublishedViews.
+        """
+        return f"<!date^{int(self.created_at)}^{format}|{datetime.fromtimestamp(self.created_at).strftime('%m/%d/%Y, %H:%M:%S')}>"
+
+
+@cache_for_n_seconds(seconds=2)
+def get_cluster_snapshot():
+    """Snapshot of the cluster polled in this process"""
+    return ClusterSnapshot(get_slum_node_dict(), get_slum_job_dict(), cluster=get_local_cluster())
+
+
+def get_user_job_dict(unix_user_name, snapshot=None, max_snapshot_age=config.USER_JOBS_MAX_SNAPSHOT_AGE):
+    """
+    job id -> job info of every job of `unix_user_name`, running and pending alike. Taken from `snapshot` if it is
+    at most `max_snapshot_age` seconds old, otherwise slurmctld is asked for the jobs of that user only. Clusters
+    polled from a worker process are always served from their snapshot.
+    """
+    if snapshot is not None and (snapshot.age <= max_snapshot_age or snapshot.cluster.remote):
+        return snapshot.jobs_by_user.get(unix_user_name, {})
+    if (uid := get_passwd_index().uid(unix_user_name)) is None:
+        return {}
+    return get_slum_user_job_dict(uid)
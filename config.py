@@ -2,6 +2,56 @@ import logging
 
 NEW_GPU_DISPLAY_ORDER = ['v100s', 'rtx6k', 'rtx8k', 'a4500', 'a40', 'a6000'][::-1]
 OLD_GPU_DISPLAY_ORDER = ['m40', 'p40'][::-1]
+CLUSTERS = {  # cluster name -> settings of every Slurm cluster shown, the first one is the default, see cluster/registry.py
+    'triton': {
+        'slurm_conf': None,  # None: the cluster of this host's slurm.conf, else polled from a worker process with SLURM_CONF set
+        'gpu_display_order': (NEW_GPU_DISPLAY_ORDER, OLD_GPU_DISPLAY_ORDER),  # (newer, older) gpu types, unknown types come first
+        'display_partitions': [('ddp-4way', 'ddp4'), ('ddp-2way', 'ddp2'), ('gpu', 'gpu'), ('low-prio-gpu', 'lp')],
+        'lp_partition': 'low-prio-gpu',  # preemptible partition, counted as low priority usage
+        'cpu_partitions': ['compute'],  # left out of the job lists and the user summaries
+        'user_summaries': [  # (title, ignored partitions, gpu limit) of the User Summary tables
+            ('All GPUs', ['compute'], 52),
+            ('Non-preemptible GPUs', ['compute', 'low-prio-gpu'], 12),
+            ('`ddp-4way` GPUs', ['compute', 'ddp-2way', 'gpu', 'low-prio-gpu'], 12),
+            ('`ddp-2way` GPUs', ['compute', 'ddp-4way', 'gpu', 'low-prio-gpu'], 12),
+            ('`gpu` GPUs', ['compute', 'ddp-4way', 'ddp-2way', 'low-prio-gpu'], 12),
+            ('Preemptible GPUs', ['compute', 'ddp-4way', 'ddp-2way', 'gpu'], 40),
+        ],
+    },
+}
+CLUSTER_POLL_TIMEOUT = 60  # seconds a cluster polled from a worker process may take before the worker is restarted
 LOGGER_PREFIX = 'vggbot'
 LOGGER_OUTPUT = 'logs'
 LOGGER_LEVEL = logging.INFO
+LOGGER_QUEUE_SIZE = 10000  # records waiting for the logging thread, 0 writes them from the thread logging them; records logged while it is full are dropped and counted
+LOGGER_MAX_BYTES = 50 * 2 ** 20  # size at which the log file is rotated, 0 rotates it at LOGGER_ROTATE_WHEN instead
+LOGGER_ROTATE_WHEN = 'midnight'  # `when` of logging.handlers.TimedRotatingFileHandler, used when LOGGER_MAX_BYTES is 0
+LOGGER_BACKUP_COUNT = 14  # rotated log files kept, gzipped
+LOGGER_JSON = False  # JSON lines log file, with the timing fields of a record (seconds, cluster, ...) as keys
+SLURM_POLL_INTERVAL = 10  # seconds between two slurmctld polls of the background collector
+SLURM_POLL_TIMEOUT = 30  # seconds a request waits for the first snapshot before querying slurm itself
+PASSWD_FILE = '/etc/passwd'  # reloaded when its mtime changes
+PASSWD_TTL = 60 * 60  # seconds after which the passwd index is reloaded anyway (LDAP/SSSD)
+STATE_FILE = 'cache/state.json'  # identity map, passwd index and optionally the last snapshot, kept across restarts
+STATE_SAVE_INTERVAL = 5 * 60  # seconds between two saves of the state file
+PERSIST_SNAPSHOT = False  # also keep the last slurm snapshot, to serve the home tab before the first poll completes
+USER_JOBS_MAX_SNAPSHOT_AGE = 30  # seconds a snapshot is used for "Your Jobs", older ones query slurm for the user's jobs only
+TABLE_MAX_CHUNKS = 10  # code blocks a single table may take, longer ones end with a "... more lines" note
+QUERY_INLINE_MATCHES = 50  # /jobs and /nodes answers with more matches are acknowledged at once and sent through the response_url
+QUERY_MAX_ROWS = 500  # rows of a /jobs or /nodes answer, the others are only counted
+QUERY_MAX_MESSAGES = 5  # messages of an answer sent through the response_url, Slack accepts 5 per response_url
+JOB_BROWSER_PAGE_SIZE = 20  # jobs per page of the job lists of the home tab, the rest is paged through with buttons
+RENDER_CACHE_TTL = 5 * 60  # seconds the shared home tab sections of a snapshot version are kept
+BOT_MODE = 'sync'  # 'sync' (Bolt App) or 'async' (Bolt AsyncApp), can be overridden with `python app.py --mode`
+ASYNC_WORKERS = 8  # threads running slurm queries and rendering in async mode
+ASYNC_PUBLISH_CONCURRENCY = 4  # views.publish/views.update calls awaited at once in async mode, one per user at a time
+SLACK_RATE_LIMITS = {  # Slack Web API method -> (calls per minute, burst), Tier 4 for views.*
+    'views.publish': (100, 10),
+    'views.update': (100, 10),
+}
+LIVE_HOME_TTL = 15 * 60  # seconds after opening or refreshing the home tab during which it is kept up to date
+LIVE_HOME_PUSHES_PER_MINUTE = (30, 10)  # (rate, burst) of home tabs pushed on snapshot changes
+METRICS_PORT = 9464  # local /metrics endpoint in Prometheus text format, None to disable
+METRICS_ADDR = '127.0.0.1'
+HISTORY_FILE = 'cache/history.sqlite'  # utilization time series of the cluster, see cluster/history.py
+HISTORY_INTERVAL = 60  # seconds between two history samples
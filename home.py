@@ -0,0 +1,427 @@
+import re
+import traceback
+from collections import Counter
+
+import config
+from cluster.collector import get_latest_snapshot, get_latest_snapshots
+from cluster.history import cluster_histories
+from cluster.job_index import JobIndex, get_job_index
+from cluster.node import get_job_row, get_job_table, get_node_info_blocks, get_node_user_blocks
+from cluster.query import GRAMMAR, find_jobs, find_nodes, get_node_index, parse_query
+from cluster.registry import get_cluster, get_clusters
+from cluster.snapshot import get_user_job_dict
+from job_browser import get_job_browser_blocks
+from utils.cache import cache_for_n_seconds
+from utils.log import get_logger
+from utils.slack2unix import get_slack2unix_map
+from utils.table import Table, context_blocks
+
+logger = get_logger(__name__)
+
+MAX_HOME_BLOCKS = 100  # Slack's limits on the blocks of a view and of a message
+MAX_MESSAGE_BLOCKS = 50
+
+
+def _snapshot_key(snapshot):
+    return snapshot.version
+
+
+# The sections below are the same for everyone looking at the same snapshot. They are rendered once per snapshot
+# version, concurrent renders of the same version wait for the first one.
+
+@cache_for_n_seconds(seconds=config.RENDER_CACHE_TTL, maxsize=4 * len(config.CLUSTERS), key=_snapshot_key)
+def get_cluster_summary_blocks(snapshot):
+    return [{
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "*GPU Cluster Summary:*",
+        }
+    }, *get_node_info_blocks(snapshot)]
+
+
+@cache_for_n_seconds(seconds=config.RENDER_CACHE_TTL, maxsize=4 * len(config.CLUSTERS), key=_snapshot_key)
+def get_user_summary_blocks(snapshot):
+    return [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": "*User Summary:*",
+            }
+        }, *[block for title, ignore_partition, limit in snapshot.cluster.user_summaries
+             for block in get_node_user_blocks(snapshot, title, ignore_partition=ignore_partition, limit=limit)],
+    ]
+
+
+def get_waiting_blocks(snapshot, user_id):
+    """One page of the pending jobs of everyone, the page and filters are the user's own"""
+    return [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*Waiting in Cluster:*\n",
+            }
+        }, *get_job_browser_blocks(user_id, f"{snapshot.cluster.name}/waiting", get_job_index(snapshot), 'PENDING'),
+    ]
+
+
+def find_cluster(text):
+    """Name of the first cluster mentioned in `text`, None if there is none"""
+    clusters = get_clusters()
+    return next((word for word in (text or "").split() if word in clusters), None)
+
+
+def limit_blocks(blocks, limit, note="_Too much to show here, use `/cluster <name>` for a single cluster._"):
+    """Cuts `blocks` to Slack's limit, with `note` in place of the last one"""
+    if len(blocks) <= limit:
+        return blocks
+    logger.warning(f"Cutting {len(blocks)} blocks to {limit}")
+    return blocks[:limit - 1] + [{
+        "type": "context",
+        "elements": [{"type": "mrkdwn", "text": note}]
+    }]
+
+
+def get_cluster_title_blocks(name, snapshot):
+    """Section heading a cluster when more than one is shown"""
+    text = f"*{name}*  _(updated {snapshot.updated_date('{ago}')})_" if snapshot is not None else f"*{name}*  _(no data yet, slurmctld not reachable)_"
+    return [{"type": "divider"}, {"type": "section", "text": {"type": "mrkdwn", "text": text}}]
+
+
+def get_cluster_totals_blocks(snapshots):
+    """Free, low priority and total gpus of every cluster and of all of them"""
+    rows, totals = [], [0, 0, 0]
+    for name, snapshot in snapshots.items():
+        if snapshot is None:
+            rows.append(f"{name:<12} {'--':>9} {'--':>9}")
+            continue
+        free = sum(node_info.gpu_free for node_dict in snapshot.nodes.values() for node_info in node_dict.values())
+        lp = sum(node_lp.gpu for node_lp in snapshot.node_lp.values())
+        total = sum(node_info.gpu_total for node_dict in snapshot.nodes.values() for node_info in node_dict.values())
+        rows.append(f"{name:<12} {f'{free}/{total}':>9} {f'{lp}/{total}':>9}")
+        totals = [totals[0] + free, totals[1] + lp, totals[2] + total]
+    rows.append(f"{'all':<12} {f'{totals[0]}/{totals[2]}':>9} {f'{totals[1]}/{totals[2]}':>9}")
+    return [{
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "*All Clusters:*",
+        }
+    }, {
+        "type": "context",
+        "elements": [{"type": "mrkdwn", "text": "```" + "\n".join([f"{'cluster':<12} {'free_gpu':>9} {'lp_gpu':>9}", *rows]) + "```"}]
+    }]
+
+
+def get_cluster_blocks(snapshot, user_id, unix_user):
+    blocks = get_cluster_summary_blocks(snapshot)
+    if unix_user:
+        user_index = JobIndex(snapshot, get_user_job_dict(unix_user, snapshot))
+        blocks = [
+            *blocks,
+            *get_user_summary_blocks(snapshot),
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*Your Jobs (`{unix_user}`):*\n",
+                }
+            }, *get_job_browser_blocks(user_id, f"{snapshot.cluster.name}/running", user_index, 'RUNNING', filters=("partition", "gpu")),
+            *get_job_browser_blocks(user_id, f"{snapshot.cluster.name}/pending", user_index, 'PENDING', filters=("partition", "gpu")),
+            *get_waiting_blocks(snapshot, user_id),
+        ]
+    return blocks
+
+
+def get_home_tab_blocks(user_id):
+    try:
+        unix_user = get_slack2unix_map().get(user_id, None)
+        snapshots = get_latest_snapshots()
+        single = len(snapshots) == 1 and (snapshot := next(iter(snapshots.values()))) is not None
+        if single:
+            last_updated = snapshot.updated_date()
+        else:
+            last_updated = ", ".join(f"{name} {snapshot.updated_date('{ago}') if snapshot else 'never'}" for name, snapshot in snapshots.items())
+        blocks = [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*Hi <@{user_id}>* :wave: ",
+                }
+            }, {
+                "type": "section",
+                "block_id": "last_updated",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"Last updated: {last_updated} \n"
+                },
+                "accessory": {
+                    "type": "button",
+                    "text": {
+                        "type": "plain_text",
+                        "text": "Refresh",
+                        "emoji": True
+                    },
+                    "value": "refresh_home",
+                    "action_id": "action_refresh_home"
+                }
+            }]
+
+        if single:
+            blocks.extend(get_cluster_blocks(snapshot, user_id, unix_user))
+        else:
+            blocks.extend(get_cluster_totals_blocks(snapshots))
+            for name, snapshot in snapshots.items():
+                blocks.extend(get_cluster_title_blocks(name, snapshot))
+                if snapshot is not None:
+                    blocks.extend(get_cluster_blocks(snapshot, user_id, unix_user))
+        if not unix_user:
+            blocks.extend(get_no_account_found_blocks())
+        blocks = limit_blocks(blocks, MAX_HOME_BLOCKS - 1)
+        blocks.extend([
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": " ",
+                },
+                "accessory": {
+                    "type": "button",
+                    "text": {
+                        "type": "plain_text",
+                        "text": "Notes",
+                        "emoji": True
+                    },
+                    "value": "readme",
+                    "action_id": "action_readme",
+                }
+            }]
+        )
+        return blocks
+    except Exception:
+        logger.error(f"Failed to get home tab blocks")
+        traceback.print_exc()
+        return []
+
+
+def command_cluster_stats(user_id, text=""):
+    """GPU availability of the cluster named in `text`, of every cluster if none is named"""
+    unix_user = get_slack2unix_map().get(user_id, None)
+    if unix_user:
+        if (name := find_cluster(text)) is not None or len(get_clusters()) == 1:
+            if (snapshot := get_latest_snapshot(name)) is None:
+                return get_cluster_title_blocks(get_cluster(name).name, None)[1:]
+            return limit_blocks([{
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*Hi <@{user_id}>* :wave:\nHere is the GPU availability summary ({snapshot.updated_str()})",
+                }
+            }, *get_cluster_summary_blocks(snapshot)[1:]], MAX_MESSAGE_BLOCKS, note="_Too much to show here, the full summary is in the home tab._")
+
+        snapshots = get_latest_snapshots()
+        blocks = [{
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*Hi <@{user_id}>* :wave:\nHere is the GPU availability summary of {len(snapshots)} clusters",
+            }
+        }, *get_cluster_totals_blocks(snapshots)[1:]]
+        for name, snapshot in snapshots.items():
+            blocks.extend(get_cluster_title_blocks(name, snapshot))
+            if snapshot is not None:
+                blocks.extend(get_cluster_summary_blocks(snapshot)[1:])
+        return limit_blocks(blocks, MAX_MESSAGE_BLOCKS)
+    else:
+
+        return get_no_account_found_blocks()
+
+def run_query(user_id, text, kind):
+    """
+    (cluster name, snapshot, Query, matches) of `/jobs` or `/nodes` with `text`, answered from the indexes of the snapshot of the
+    cluster named in `text` (the default one otherwise). None if the user has no cluster account.
+    """
+    unix_user = get_slack2unix_map().get(user_id, None)
+    if not unix_user:
+        return None
+    name = find_cluster(text)
+    if (snapshot := get_latest_snapshot(name)) is None:
+        return get_cluster(name).name, None, None, []
+    index = get_job_index(snapshot) if kind == "jobs" else get_node_index(snapshot)
+    query = parse_query(text, kind, index, unix_user=unix_user, ignore=(name,))
+    return snapshot.cluster.name, snapshot, query, find_jobs(snapshot, query) if kind == "jobs" else find_nodes(snapshot, query)
+
+
+def get_node_table(entries):
+    table = Table(["node", "type", "partition", "free_gpu", "free_cpu", "free_mem", "state", "users"], align=["<", "<", "<", ">", ">", ">", ">", "<"])
+    for entry in entries:
+        record = entry.record
+        table.add_row((entry.name, record.gpu_type, record.partitions, f"{record.gpu_free}/{record.gpu_total}",
+                       f"{record.cpu_free}/{record.cpu_total}", f"{record.mem_free}/{record.mem_total}{record.mem_unit}",
+                       record.state, ",".join(entry.users) or "--"))
+    return table
+
+
+def get_query_messages(result, kind):
+    """The answer to `run_query` as a list of messages, each a list of blocks within Slack's limit"""
+    if result is None:
+        return [get_no_account_found_blocks()]
+    name, snapshot, query, matches = result
+    if snapshot is None:
+        return [get_cluster_title_blocks(name, None)[1:]]
+
+    cluster = f" on {snapshot.cluster.name}" if len(get_clusters()) > 1 else ""
+    blocks = [{
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": f"*{len(matches)} {kind if len(matches) != 1 else kind[:-1]}*{cluster} matching `{query}` ({snapshot.updated_str()})",
+        }
+    }]
+    if query.errors:
+        blocks.extend(context_blocks(["Ignored " + ", ".join(query.errors) + f".\nFilters: {GRAMMAR[kind]}"]))
+    if matches:
+        if kind == "jobs":
+            states = Counter(entry.job_info.job_state for entry in matches)
+            blocks.extend(context_blocks([f"*{sum(entry.job_info.num_gpus for entry in matches)}* GPUs  ·  "
+                                          + "  ·  ".join(f"{state.lower()} {count}" for state, count in states.most_common())]))
+            table = get_job_table([get_job_row(snapshot, entry.job_id, entry.job_info) for entry in matches[:config.QUERY_MAX_ROWS]])
+        else:
+            table = get_node_table(matches[:config.QUERY_MAX_ROWS])
+        blocks.extend(context_blocks(table.chunks()))
+        if len(matches) > config.QUERY_MAX_ROWS:
+            blocks.extend(context_blocks([f"… {len(matches) - config.QUERY_MAX_ROWS} more, add filters to narrow it down"]))
+
+    messages = [blocks[i:i + MAX_MESSAGE_BLOCKS] for i in range(0, len(blocks), MAX_MESSAGE_BLOCKS)]
+    if len(messages) > config.QUERY_MAX_MESSAGES:
+        messages = messages[:config.QUERY_MAX_MESSAGES]
+        messages[-1] = messages[-1][:-1] + context_blocks(["_Too many to show here, add filters to narrow it down._"])
+    return messages
+
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+WINDOW_UNITS = {"m": 60, "h": 3600, "d": 24 * 3600, "w": 7 * 24 * 3600}
+
+
+def parse_window(text, default=24 * 3600):
+    """"90m", "24h", "7d", "4w" -> seconds, capped at a year"""
+    if match := re.search(r"(\d+)\s*([mhdw])", text or ""):
+        return min(int(match.group(1)) * WINDOW_UNITS[match.group(2)], 365 * 24 * 3600) or default
+    return default
+
+
+def format_window(seconds):
+    for unit in "wdhm":
+        if seconds % WINDOW_UNITS[unit] == 0:
+            return f"{seconds // WINDOW_UNITS[unit]}{unit}"
+    return f"{seconds}s"
+
+
+def sparkline(values, top=None):
+    known = [v for v in values if v is not None]
+    top = top or max(known, default=0) or 1
+    return "".join(" " if v is None else SPARK_CHARS[min(len(SPARK_CHARS) - 1, int(v / top * (len(SPARK_CHARS) - 1) + 0.5))] for v in values)
+
+
+def command_history(user_id, text):
+    unix_user = get_slack2unix_map().get(user_id, None)
+    window = parse_window(text)
+    cluster = get_cluster(find_cluster(text))
+    cluster_history = cluster_histories[cluster.name]
+    gpu_trends = cluster_history.trend("gpu", window)
+    if not gpu_trends:
+        return [{"type": "section", "text": {"type": "mrkdwn", "text": "No cluster history recorded yet."}}]
+
+    rows = []
+    for gpu_type, points in sorted(gpu_trends.items()):
+        known = [values for _, values in points if values is not None]
+        total = max(values["gpu_total"] for values in known)
+        used_avg = sum(values["gpu_used"] for values in known) / len(known)
+        rows.append(f"{gpu_type:>6}  {sparkline([values and values['gpu_used'] for _, values in points], top=total)}  "
+                    f"{known[-1]['gpu_used']:3.0f}/{total:3.0f} now  {used_avg / total if total else 0:4.0%} avg")
+    pending_rows = [f"{partition[:12]:>12}  {sparkline([values and values['pending'] for _, values in points])}  {max((values['pending'] for _, values in points if values), default=0):5.0f} max"
+                    for partition, points in sorted(cluster_history.trend("partition", window).items()) if partition not in cluster.cpu_partitions]
+
+    gpu_hours = cluster_history.gpu_hours(window)
+    top_users = [f"{name[:12]:>12}  {hours:8.1f}  {lp_hours:8.1f}" for name, hours, lp_hours in gpu_hours[:15]]
+    own = next(((rank, hours) for rank, (name, hours, _) in enumerate(gpu_hours, 1) if name == unix_user), None)
+    step = format_window(max(60, window // 24))
+    blocks = [{
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": f"*{'Cluster' if len(get_clusters()) == 1 else cluster.name} history, last {format_window(window)}* (one bar per {step})",
+        }
+    }, {
+        "type": "context",
+        "elements": [{"type": "mrkdwn", "text": "*GPUs in use*\n```" + "\n".join(rows) + "```"}]
+    }]
+    if pending_rows:
+        blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": "*Pending jobs*\n```" + "\n".join(pending_rows) + "```"}]})
+    if top_users:
+        text = "*GPU-hours*\n```" + "\n".join([f"{'user':>12}  {'gpu-h':>8}  {'lp gpu-h':>8}", *top_users]) + "```"
+        if own is not None:
+            text += f"\nYou (`{unix_user}`): {own[1]:.1f} GPU-hours, #{own[0]} of {len(gpu_hours)}"
+        blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": text}]})
+    return blocks
+
+
+def get_no_account_found_blocks():
+    return [{
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": f"*Error:*",
+        }
+    }, {
+        "type": "context",
+        "elements": [
+            {
+                "type": "mrkdwn",
+                "text": f"You do not seem to have a cluster account.\n"
+                        f"Reason: Cannot find any account matching your Slack full name (not display name) in tritons's `/etc/passwd` database.\n"
+                        f"Remedy: Run `getent passwd $USER` to look for your full name in triton and set the same on Slack."
+            }
+        ]
+    }]
+
+
+def get_readme_view():
+    return {
+        "type": "modal",
+        # View identifier
+        "callback_id": "readme",
+        "title": {
+            "type": "plain_text",
+            "text": "Notes"
+        },
+        "blocks": [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "1. The code is here: <https://github.com/subhc/susbot|github link>"
+                }
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "2. If the app is not refreshing the server most likely is down. On clicking the  `Refresh` button if an exclamation mark appears beside it the server is down. Ping me. \nIf you are curious run `ls -ltra "
+                            "/work/subha/apps/VGGBot/logs` and check the latest log "
+                }
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "3. If your jobs don't show up or the displayed linux username is wrong then the app has failed to find any account matching your Slack full name (not display name) in tritons's `/etc/passwd` database. \nTo fix, "
+                            "run `getent passwd $USER` to look for your full name in triton and set the same on Slack. Furthermore if you have multiple Slack accounts, (maybe one from before you formally joined VGG) your linux account can get mapped to the other Slack account.\nTake a look at the account matching logic <https://github.com/subhc/susbot/blob/main/utils/slack2unix.py|here> "
+                }
+            }
+        ],
+        "type": "modal"
+    }
@@ -0,0 +1,135 @@
+import json
+import threading
+import time
+
+import config
+from cluster.job_index import FILTERS, SORTS
+from cluster.node import get_job_row, get_job_table
+from utils.log import get_logger
+from utils.table import context_blocks
+
+logger = get_logger(__name__)
+
+ALL = "*"  # option value of "every partition/user/gpu"
+FILTER_LABELS = {"partition": "All partitions", "user": "All users", "gpu": "All GPU types"}
+MAX_OPTIONS = 100  # Slack's limit on the options of a static select
+
+
+class JobBrowser:
+    """
+    Filters, sort and page of every job list a user looked at in the home tab, by (slack user id, section).
+    Kept `ttl` seconds after the last use, so that refreshes and live home pushes show the same page.
+    """
+
+    def __init__(self, ttl=config.LIVE_HOME_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._states = {}  # (slack user id, section) -> (state, last used)
+
+    def get(self, user_id, section):
+        with self._lock:
+            state, _ = self._states.get((user_id, section), (None, None))
+        return dict(state) if state is not None else dict(sort="priority", partition=None, user=None, gpu=None, after=None, before=None)
+
+    def update(self, user_id, section, **changes):
+        state = {**self.get(user_id, section), **changes}
+        now = time.time()
+        with self._lock:
+            self._states = {key: value for key, value in self._states.items() if now - value[1] < self.ttl}
+            self._states[user_id, section] = (state, now)
+        return state
+
+    def handle_action(self, user_id, action):
+        """Applies a click on the page buttons or a filter/sort selection, returns False for actions of unknown views"""
+        _, _, section = action.get("block_id", "").partition(":")
+        name = action["action_id"][len("jobs_"):]
+        if not section:
+            return False
+        if name in ("prev", "next"):
+            cursor = json.loads(action["value"])
+            self.update(user_id, section, after=cursor if name == "next" else None, before=cursor if name == "prev" else None)
+        elif name == "sort" or name in FILTERS:
+            value = action["selected_option"]["value"]
+            self.update(user_id, section, **{name: None if value == ALL else value}, after=None, before=None)
+        else:
+            return False
+        return True
+
+
+job_browser = JobBrowser()
+
+
+def _option(text, value):
+    return {"text": {"type": "plain_text", "text": text[:75]}, "value": value[:75]}
+
+
+def _select(action_id, placeholder, options, selected):
+    element = {
+        "type": "static_select",
+        "action_id": action_id,
+        "placeholder": {"type": "plain_text", "text": placeholder},
+        "options": options,
+    }
+    if selected is not None:
+        element["initial_option"] = next((option for option in options if option["value"] == selected), options[0])
+    return element
+
+
+def get_summary_text(view, state):
+    """e.g. "*412* jobs, *530* GPUs · ddp-2way 120 · gpu 200 | Priority 300 · Resources 100\""""
+    text = f"*{len(view)}* jobs, *{view.num_gpus}* GPUs"
+    if view.partitions:
+        text += "  ·  " + "  ·  ".join(f"{partition} {count}" for partition, count in view.partitions.most_common())
+    if state == "PENDING" and view.reasons:
+        text += "\n" + "  ·  ".join(f"{reason} {count}" for reason, count in view.reasons.most_common(8))
+    return text
+
+
+def get_job_browser_blocks(user_id, section, index, state, title=None, filters=FILTERS, page_size=None):
+    """
+    One page of the jobs of `state` in `index`, with a summary of every job matching the filters in place of the
+    full list. Filter, sort and page controls only show up when there is more than one page or a filter is set.
+    `section` identifies the list in the actions, e.g. "<cluster>/waiting".
+    """
+    page_size = page_size or config.JOB_BROWSER_PAGE_SIZE
+    browser_state = job_browser.get(user_id, section)
+    selected = {name: browser_state[name] for name in filters}
+    view = index.view(state, sort=browser_state["sort"], **selected)
+    entries, start = view.page(page_size, after=browser_state["after"], before=browser_state["before"])
+    if not entries and len(view) > 0:  # the jobs after the cursor are gone, back to the first page
+        entries, start = view.page(page_size)
+
+    blocks = [{
+        "type": "context",
+        "elements": [{"type": "mrkdwn", "text": f"*{title or state.title() + ' Jobs'}*"}]
+    }]
+    if len(view) > 0:
+        blocks.extend(context_blocks([get_summary_text(view, state)]))
+
+    if len(view) > page_size or any(value is not None for value in selected.values()):
+        options = index.options(state)
+        elements = [_select(f"jobs_{name}", FILTER_LABELS[name],
+                            [_option(FILTER_LABELS[name], ALL), *[_option(value, value) for value in options[name][:MAX_OPTIONS - 1]]],
+                            selected[name] or ALL)
+                    for name in filters if options[name]]
+        elements.append(_select("jobs_sort", "Sort", [_option(f"Sort: {label}", name) for name, (label, _) in SORTS.items()], browser_state["sort"]))
+        blocks.append({"type": "actions", "block_id": f"jobs_filters:{section}", "elements": elements})
+
+    if entries:
+        rows = [get_job_row(index.snapshot, entry.job_id, entry.job_info) for entry in entries]
+        blocks.extend(context_blocks(get_job_table(rows).chunks(max_chunks=config.TABLE_MAX_CHUNKS)))
+    else:
+        blocks.extend(context_blocks([f"No {state.lower()} jobs!"]))
+
+    if len(view) > page_size:
+        buttons = []
+        if start > 0:
+            buttons.append({"type": "button", "action_id": "jobs_prev", "text": {"type": "plain_text", "text": "◀ Previous"},
+                            "value": json.dumps(view.cursor(start))})
+        if start + len(entries) < len(view):
+            buttons.append({"type": "button", "action_id": "jobs_next", "text": {"type": "plain_text", "text": "Next ▶"},
+                            "value": json.dumps(view.cursor(start + len(entries) - 1))})
+        blocks.extend(context_blocks([f"{start + 1}–{start + len(entries)} of {len(view)}"]))
+        if buttons:
+            blocks.append({"type": "actions", "block_id": f"jobs_pages:{section}", "elements": buttons})
+    return blocks
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import defaultdict
+
+import config
+from cluster.collector import get_collectors
+from home import get_home_tab_blocks
+from utils.log import get_logger
+from utils.publisher import TokenBucket, get_publish_queue
+from utils.slack2unix import get_slack2unix_map
+
+logger = get_logger(__name__)
+
+
+def get_gpu_availability(snapshot):
+    """gpu type -> (free, low priority, total) gpus"""
+    return {node_type: (sum(v.gpu_free for v in node_dict.values()), sum(snapshot.node_lp[k].gpu for k in node_dict), sum(v.gpu_total for v in node_dict.values()))
+            for node_type, node_dict in snapshot.nodes.items()}
+
+
+def get_jobs_by_user(snapshot):
+    """unix user -> sorted (job id, state, node) of the user's jobs"""
+    jobs_by_user = defaultdict(list)
+    for job_id, job_info in snapshot.job_dict.items():
+        jobs_by_user[snapshot.uid2user[job_info.user_id]].append((job_id, job_info.job_state, job_info.batch_host))
+    return {user: sorted(jobs) for user, jobs in jobs_by_user.items()}
+
+
+class LiveHomeTabs:
+    """
+    Keeps the home tabs opened in the last `ttl` seconds up to date. On every new snapshot of any cluster, the home tab of a user
+    is rendered again and queued for publishing only if the gpu availability or the user's own jobs changed.
+    Pushes are paced by a token bucket, users over the limit are pushed on one of the next snapshots.
+
+    The collector thread only works out which users are affected, their home tabs are rendered on a thread of their own
+    so that a burst of renders does not delay the next poll. A user still waiting for a render is rendered once.
+    """
+
+    def __init__(self, ttl=config.LIVE_HOME_TTL, pushes_per_minute=config.LIVE_HOME_PUSHES_PER_MINUTE):
+        self.ttl = ttl
+        self._bucket = TokenBucket(pushes_per_minute[0] / 60., pushes_per_minute[1])
+        self._lock = threading.Lock()
+        self._active = {}  # slack user id -> last time the home tab was opened or refreshed
+        self._dirty = set()  # users whose push was postponed by the rate limit
+        self._to_render = {}  # users waiting for a render, in order
+        self._wakeup = threading.Condition(self._lock)
+
+    def touch(self, user_id):
+        with self._lock:
+            self._active[user_id] = time.time()
+            self._dirty.discard(user_id)
+
+    def _get_active_users(self):
+        now = time.time()
+        with self._lock:
+            self._active = {user_id: opened_at for user_id, opened_at in self._active.items() if now - opened_at < self.ttl}
+            return list(self._active)
+
+    def on_snapshot(self, previous, snapshot):
+        if previous is None or not (active_users := self._get_active_users()):
+            return
+        gpus_changed = get_gpu_availability(previous) != get_gpu_availability(snapshot)
+        previous_jobs, jobs = (None, None) if gpus_changed else (get_jobs_by_user(previous), get_jobs_by_user(snapshot))
+        slack2unix_map = get_slack2unix_map()
+
+        pushed = postponed = 0
+        for user_id in active_users:
+            unix_user = slack2unix_map.get(user_id)
+            with self._lock:
+                affected = gpus_changed or user_id in self._dirty or previous_jobs.get(unix_user) != jobs.get(unix_user)
+                queued = user_id in self._to_render  # rendered from the latest snapshot anyway
+            if not affected or queued:
+                continue
+            if not self._bucket.try_acquire():
+                with self._lock:
+                    self._dirty.add(user_id)
+                postponed += 1
+                continue
+            with self._lock:
+                self._dirty.discard(user_id)
+                self._to_render[user_id] = None
+                self._wakeup.notify()
+            pushed += 1
+        if pushed or postponed:
+            logger.info(f"Pushing {pushed} live home tabs, {postponed} postponed ({len(active_users)} active)")
+
+    def _render(self):
+        while True:
+            with self._lock:
+                while not self._to_render:
+                    self._wakeup.wait()
+                user_id = next(iter(self._to_render))
+                del self._to_render[user_id]
+            try:
+                get_publish_queue().submit(user_id, "views.publish", view={"type": "home", "blocks": get_home_tab_blocks(user_id)})
+            except Exception:
+                logger.exception(f"Failed to render the live home tab of {user_id}")
+
+    def start(self):
+        threading.Thread(target=self._render, name="live-home-render", daemon=True).start()
+        for collector in get_collectors().values():
+            collector.add_listener(self.on_snapshot)
+
+
+live_home_tabs = LiveHomeTabs()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the fake pyslurm and synthetic cluster of the benchmarks
+sys.path[:0] = [os.path.join(ROOT, "benchmarks", "fake_pyslurm"), ROOT, os.path.join(ROOT, "benchmarks")]
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from utils.cache import TTLCache
+
+
+def test_concurrent_misses_load_once():
+    calls, release = [], threading.Event()
+
+    def loader(key):
+        calls.append(key)
+        release.wait(5)
+        return key * 2
+
+    cache = TTLCache(loader, ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(21))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.info()["in_flight"] == 0:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [21]
+    assert results == [42] * 8
+    assert cache.info()["loads"] == 1
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        raise ValueError("slurmctld down")
+
+    cache = TTLCache(loader, ttl=60)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            cache.get()
+    assert len(calls) == 2
+
+
+def test_stale_entry_is_served_while_it_reloads():
+    values, reloading, release = iter(["old", "new"]), threading.Event(), threading.Event()
+
+    def loader():
+        value = next(values)
+        if value == "new":
+            reloading.set()
+            release.wait(5)
+        return value
+
+    cache = TTLCache(loader, ttl=60, stale_while_revalidate=True)
+    assert cache.get() == "old"
+    cache.put("old", expires_at=0)
+    assert cache.get() == "old"  # returned at once, reloaded in the background
+    assert reloading.wait(5)
+    assert cache.get() == "old"  # a single reload in flight
+    assert cache.info()["in_flight"] == 1
+    release.set()
+    for _ in range(500):
+        if cache.info()["in_flight"] == 0:
+            break
+        time.sleep(0.01)
+    assert cache.get() == "new"
+    assert cache.info()["stale_hits"] == 2
+
+
+def test_expiry_negative_ttl_and_lru():
+    cache = TTLCache(lambda key: [] if key == "empty" else [key], ttl=60, negative_ttl=0, maxsize=2)
+    cache.get("a"), cache.get("b"), cache.get("a"), cache.get("c")  # b is the least recently used
+    assert cache.info()["evictions"] == 1
+    loads = cache.info()["loads"]
+    cache.get("a"), cache.get("c")
+    assert cache.info()["loads"] == loads
+    cache.get("b")
+    assert cache.info()["loads"] == loads + 1
+    cache.get("empty"), cache.get("empty")  # expires at once
+    assert cache.info()["loads"] == loads + 3
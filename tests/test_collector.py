@@ -0,0 +1,71 @@
+import json
+
+import pyslurm  # the fake one, see conftest.py
+import pytest
+
+import cluster.collector as collector_module
+from cluster.collector import SnapshotCollector, get_latest_snapshot
+from cluster.job_index import get_job_index
+from cluster.query import get_node_index
+
+
+def test_poll_builds_the_indexes():
+    pyslurm.configure(num_nodes=10, num_jobs=20)
+    collector = SnapshotCollector()
+    collector.poll()
+    misses = get_job_index.cache_info()["misses"], get_node_index.cache_info()["misses"]
+    assert len(get_job_index(collector.snapshot).entries) == len(collector.snapshot.job_dict)
+    get_node_index(collector.snapshot)
+    assert (get_job_index.cache_info()["misses"], get_node_index.cache_info()["misses"]) == misses
+
+
+class FailingCollector(SnapshotCollector):
+    def _fetch(self):
+        raise ConnectionError("slurmctld not reachable")
+
+
+def test_without_a_collector_slurm_is_queried_inline(monkeypatch):
+    pyslurm.configure(num_nodes=10, num_jobs=20)
+    monkeypatch.setattr(collector_module, "_collectors", {})
+    snapshot = get_latest_snapshot()
+    assert snapshot is not None and len(snapshot.job_dict) == 20
+
+
+def test_collector_snapshot_is_served(monkeypatch):
+    pyslurm.configure(num_nodes=10, num_jobs=20)
+    collector = SnapshotCollector()
+    collector.poll()
+    monkeypatch.setattr(collector_module, "_collectors", {collector.cluster.name: collector})
+    assert get_latest_snapshot() is collector.snapshot
+
+
+def test_failed_first_poll_falls_back_to_slurm(monkeypatch):
+    pyslurm.configure(num_nodes=10, num_jobs=20)
+    collector = FailingCollector(interval=3600)
+    monkeypatch.setattr(collector_module, "_collectors", {collector.cluster.name: collector})
+    collector.start()
+    snapshot = get_latest_snapshot()
+    collector.stop()
+    assert snapshot is not None and snapshot is not collector.snapshot and collector.snapshot is None
+
+
+def test_failed_poll_keeps_the_previous_snapshot():
+    pyslurm.configure(num_nodes=10, num_jobs=20)
+    collector = SnapshotCollector()
+    collector.poll()
+    previous = collector.snapshot
+    collector._fetch = FailingCollector._fetch.__get__(collector)
+    with pytest.raises(ConnectionError):
+        collector.poll()
+    assert collector.snapshot is previous
+
+
+def test_persisted_snapshot_until_the_first_poll():
+    pyslurm.configure(num_nodes=10, num_jobs=20)
+    collector = SnapshotCollector()
+    collector.poll()
+    state = json.loads(json.dumps(collector.export_state()))
+    restored = SnapshotCollector()
+    restored.import_state(state)
+    assert restored.get_snapshot(timeout=0).job_dict == collector.snapshot.job_dict
+    assert restored.snapshot.created_at == collector.snapshot.created_at
@@ -0,0 +1,64 @@
+from collections import Counter
+
+import pytest
+
+from cluster.history import ClusterHistory
+from cluster.snapshot import ClusterSnapshot
+from run import setup
+
+T0 = 1_700_000_000 // 3600 * 3600
+
+
+@pytest.fixture(scope="module")
+def dicts():
+    return setup("small")
+
+
+@pytest.fixture
+def history(tmp_path):
+    return ClusterHistory(str(tmp_path / "history.sqlite"), interval=60)
+
+
+def snapshot_at(dicts, ts):
+    return ClusterSnapshot(*dicts, created_at=ts)
+
+
+def test_tiers():
+    assert ClusterHistory._tier(24 * 3600) == "raw"
+    assert ClusterHistory._tier(7 * 24 * 3600) == "rollup_5m"
+    assert ClusterHistory._tier(90 * 24 * 3600) == "rollup_1h"
+
+
+def test_samples_are_spaced_and_gaps_capped(history, dicts):
+    assert history.record(snapshot_at(dicts, T0))
+    assert not history.record(snapshot_at(dicts, T0 + 30))
+    assert history.record(snapshot_at(dicts, T0 + 60))
+    assert history.record(snapshot_at(dicts, T0 + 3600))  # after downtime, counted as 2 intervals
+    seconds = [row[0] for row in history._db.execute("SELECT MAX(seconds) FROM raw GROUP BY ts ORDER BY ts")]
+    assert seconds == [60, 60, 120]
+
+
+def test_gpu_hours_are_the_same_in_every_tier(history, dicts):
+    snapshot = snapshot_at(dicts, T0)
+    gpus = Counter()
+    for job_info in snapshot.job_dict.values():
+        if job_info.job_state == "RUNNING":
+            gpus[snapshot.user_name(job_info.user_id)] += job_info.num_gpus
+    for i in range(60):  # one hour
+        history.record(snapshot_at(dicts, T0 + i * 60))
+    now = T0 + 3600
+    expected = {user: count for user, count in gpus.items() if count}
+    for window in (2 * 3600, 7 * 24 * 3600, 90 * 24 * 3600):  # raw, 5 minute and hourly rollups
+        hours = {name: used for name, used, _ in history.gpu_hours(window, now=now)}
+        assert hours == pytest.approx(expected)
+
+
+def test_trend_averages(history, dicts):
+    for i in range(60):
+        history.record(snapshot_at(dicts, T0 + i * 60))
+    snapshot = snapshot_at(dicts, T0)
+    totals = {node_type: sum(node_info.gpu_total for node_info in node_dict.values()) for node_type, node_dict in snapshot.nodes.items()}
+    trends = history.trend("gpu", 3600, points=6, now=T0 + 3600)
+    assert set(trends) == set(totals)
+    for node_type, points in trends.items():
+        assert [values["gpu_total"] for _, values in points] == [totals[node_type]] * 6
@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+import home
+from cluster.snapshot import ClusterSnapshot
+from run import setup
+from utils.publisher import PublishedViews
+
+
+@pytest.fixture(scope="module")
+def large_snapshot():
+    return ClusterSnapshot(*setup("large"))
+
+
+def test_cluster_command_fits_a_message(large_snapshot, monkeypatch):
+    monkeypatch.setattr(home, "get_slack2unix_map", lambda: {"U1": "user1"})
+    monkeypatch.setattr(home, "get_latest_snapshot", lambda name=None: large_snapshot)
+    assert len(home.get_cluster_summary_blocks(large_snapshot)) > home.MAX_MESSAGE_BLOCKS
+    blocks = home.command_cluster_stats("U1")
+    assert len(blocks) == home.MAX_MESSAGE_BLOCKS
+    assert "home tab" in blocks[-1]["elements"][0]["text"]
+
+
+@pytest.fixture(scope="module")
+def small_snapshot():
+    return ClusterSnapshot(*setup("small"))
+
+
+def test_shared_sections_are_rendered_once_per_snapshot(small_snapshot):
+    blocks = home.get_cluster_summary_blocks(small_snapshot)
+    assert home.get_cluster_summary_blocks(small_snapshot) is blocks
+    other = ClusterSnapshot(small_snapshot.node_dict, small_snapshot.job_dict)
+    assert home.get_cluster_summary_blocks(other) is not blocks
+    assert home.get_cluster_summary_blocks(other) == blocks
+
+
+def test_view_of_a_snapshot_does_not_change_with_its_age(small_snapshot, monkeypatch):
+    def render():
+        return {"type": "home", "blocks": [{"type": "section", "text": {"type": "mrkdwn", "text": f"Last updated: {small_snapshot.updated_date()}"}},
+                                           *home.get_cluster_summary_blocks(small_snapshot)]}
+
+    published_views = PublishedViews()
+    published_views.mark_published("U1", render())
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 90)
+    assert published_views.is_unchanged("U1", render())
+    assert f"<!date^{int(small_snapshot.created_at)}^" in small_snapshot.updated_date()
@@ -0,0 +1,22 @@
+import pyslurm  # the fake one, see conftest.py
+
+from cluster.job import JobRecord, get_gpu_type, get_num_gpus
+
+
+def test_tres_req_str():
+    assert get_num_gpus("cpu=8,mem=64G,node=1,billing=8,gres/gpu=4") == 4
+    assert get_num_gpus("cpu=8,mem=64G") == 0
+    assert get_gpu_type("cpu=8,gres/gpu=2,gres/gpu:a40=2") == "a40"
+    assert get_gpu_type("cpu=8,gres/gpu=2") is None
+
+
+def test_record_keeps_the_fields_read():
+    pyslurm.configure(num_nodes=10, num_jobs=20)
+    for job_id, job_info in pyslurm.job().get().items():
+        record = JobRecord.from_pyslurm(job_info)
+        assert record.num_gpus == get_num_gpus(job_info["tres_req_str"])
+        assert dict(record.cpus_allocated) == job_info["cpus_allocated"]
+        assert all(getattr(record, field) == job_info[field] for field in JobRecord.__slots__
+                   if field not in ("num_gpus", "gpu_type", "cpus_allocated"))
+        assert JobRecord(**record.to_dict()) == record
+        assert not hasattr(record, "__dict__")
@@ -0,0 +1,28 @@
+import pyslurm  # the fake one, see conftest.py
+
+from cluster.job_table import JobTable
+
+
+def test_unchanged_table_is_not_converted_again():
+    pyslurm.configure(num_nodes=10, num_jobs=20)
+    table = JobTable()
+    jobs = table.load()
+    assert table.load() is jobs
+    assert table.stats["unchanged"] == 1
+
+
+def test_job_submitted_after_unchanged_poll_shows_up():
+    pyslurm.configure(num_nodes=10, num_jobs=20)
+    table = JobTable()
+    table.load()
+    table.load()  # unchanged
+    job_id = pyslurm.submit()
+    assert job_id in table.load()
+    second_id = pyslurm.submit()
+    assert second_id in table.load()
+
+
+def test_finished_jobs_are_left_out():
+    pyslurm.configure(num_nodes=10, num_jobs=20)
+    job_id = pyslurm.submit(job_state="COMPLETED")
+    assert job_id not in JobTable().load()
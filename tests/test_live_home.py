@@ -0,0 +1,42 @@
+import threading
+
+import live_home
+from cluster.snapshot import ClusterSnapshot
+from run import setup
+
+
+class FakePublishQueue:
+    def __init__(self):
+        self.views = {}
+        self.done = threading.Event()
+
+    def submit(self, user_id, method, view, **kwargs):
+        self.views[user_id] = view
+        self.done.set()
+
+
+def test_renders_off_the_collector_thread(monkeypatch):
+    node_dict, job_dict = setup("small")
+    previous = ClusterSnapshot(node_dict, job_dict)
+    snapshot = ClusterSnapshot({name: value_dict for name, value_dict in node_dict.items() if name not in previous.node2gpu}, job_dict)
+
+    release, rendered_on = threading.Event(), []
+    publish_queue = FakePublishQueue()
+
+    def get_home_tab_blocks(user_id):
+        rendered_on.append(threading.current_thread().name)
+        release.wait(5)
+        return [{"type": "divider"}]
+
+    monkeypatch.setattr(live_home, "get_home_tab_blocks", get_home_tab_blocks)
+    monkeypatch.setattr(live_home, "get_publish_queue", lambda: publish_queue)
+    monkeypatch.setattr(live_home, "get_collectors", lambda: {})
+    tabs = live_home.LiveHomeTabs()
+    tabs.start()
+    tabs.touch("U1")
+    tabs.on_snapshot(previous, snapshot)  # returns while the render is blocked
+    tabs.on_snapshot(previous, snapshot)  # U1 is still waiting or being rendered
+    release.set()
+    assert publish_queue.done.wait(5)
+    assert rendered_on[0] == "live-home-render"
+    assert publish_queue.views["U1"]["blocks"] == [{"type": "divider"}]
@@ -0,0 +1,40 @@
+import gzip
+import json
+import logging
+
+from utils.log import _DroppingQueueHandler, _JsonFormatter, _rotating_file_handler
+
+
+def make_record(msg, **extra):
+    record = logging.LogRecord("vggbot.test", logging.INFO, __file__, 1, msg, (), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_lines_carry_the_extra_fields():
+    entry = json.loads(_JsonFormatter().format(make_record("Collected snapshot", seconds=0.25, cluster="triton")))
+    assert entry["message"] == "Collected snapshot" and entry["logger"] == "vggbot.test" and entry["level"] == "INFO"
+    assert entry["seconds"] == 0.25 and entry["cluster"] == "triton"
+    assert "msg" not in entry and "args" not in entry
+
+
+def test_rotated_files_are_gzipped(tmp_path):
+    filename = str(tmp_path / "log.txt")
+    handler = _rotating_file_handler(filename, max_bytes=1000, when="midnight", backup_count=2)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for i in range(100):
+        handler.emit(make_record(f"line {i:03d} " + "x" * 40))
+    handler.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["log.txt", "log.txt.1.gz", "log.txt.2.gz"]
+    lines = gzip.open(tmp_path / "log.txt.1.gz", "rt").read().splitlines() + open(filename).read().splitlines()
+    assert lines[-1].startswith("line 099")
+    assert [int(line.split()[1]) for line in lines] == list(range(int(lines[0].split()[1]), 100))
+
+
+def test_full_queue_drops_and_counts():
+    handler = _DroppingQueueHandler(queue_size=2)
+    for i in range(5):
+        handler.handle(make_record(f"record {i}"))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    assert handler.collect()[0][3] == [({}, 3)]
@@ -0,0 +1,24 @@
+import copy
+
+import pyslurm  # the fake one, see conftest.py
+
+from cluster.node import extract_useful_node_info_dict
+from cluster.registry import get_cluster
+
+
+def records(nodes):
+    return {node_name: record for node_dict in nodes.values() for node_name, record in node_dict.items()}
+
+
+def test_unchanged_nodes_keep_their_record():
+    pyslurm.configure(num_nodes=20, num_jobs=50)
+    node_dict = pyslurm.node().get()
+    before = records(extract_useful_node_info_dict(node_dict, get_cluster()))
+    changed = copy.deepcopy(node_dict)
+    node_name = next(iter(before))
+    changed[node_name]["alloc_cpus"] = changed[node_name]["alloc_cpus"] + 1
+    after = records(extract_useful_node_info_dict(changed, get_cluster()))
+    assert after.keys() == before.keys()
+    assert after[node_name] is not before[node_name]
+    assert after[node_name].cpu_used == before[node_name].cpu_used + 1
+    assert all(after[name] is before[name] for name in before if name != node_name)
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.slack_response import SlackResponse
+
+from utils.publisher import PublishQueue
+
+
+class FakeClient:
+    """views_publish of a WebClient, blocked until `release` is set, answering 429 to the first `rate_limited` calls"""
+
+    def __init__(self, rate_limited=0):
+        self.calls = []
+        self.rate_limited = rate_limited
+        self.release = threading.Event()
+        self.release.set()
+        self.called = threading.Event()
+
+    def views_publish(self, user_id, view):
+        self.called.set()
+        self.release.wait(5)
+        self.calls.append((user_id, view))
+        if self.rate_limited:
+            self.rate_limited -= 1
+            response = SlackResponse(client=self, http_verb="POST", api_url="views.publish", req_args={},
+                                     data={"ok": False, "error": "ratelimited"}, headers={"Retry-After": "0"}, status_code=429)
+            raise SlackApiError("ratelimited", response)
+
+
+def view(text):
+    return {"type": "home", "blocks": [{"type": "section", "text": {"type": "mrkdwn", "text": text}}]}
+
+
+def wait_for(queue, **stats):
+    for _ in range(500):
+        if all(queue.stats()[name] >= value for name, value in stats.items()) and queue.stats()["queue_depth"] == 0:
+            return
+        time.sleep(0.01)
+    raise AssertionError(queue.stats())
+
+
+def make_queue(client):
+    queue = PublishQueue(client=client, rate_limits={})
+    queue.start()
+    return queue
+
+
+def test_pending_views_of_a_user_collapse_into_the_latest():
+    client = FakeClient()
+    client.release.clear()
+    queue = make_queue(client)
+    queue.submit("U0", "views.publish", view("blocking"))
+    assert client.called.wait(5)
+    for i in range(5):
+        queue.submit("U1", "views.publish", view(f"v{i}"))
+    client.release.set()
+    wait_for(queue, published=2)
+    assert client.calls == [("U0", view("blocking")), ("U1", view("v4"))]
+    assert queue.stats()["coalesced"] == 4
+
+
+def test_unchanged_view_is_not_sent_again():
+    client = FakeClient()
+    queue = make_queue(client)
+    queue.submit("U1", "views.publish", view("a"))
+    wait_for(queue, published=1)
+    queue.submit("U1", "views.publish", view("a"))
+    wait_for(queue, unchanged=1)
+    queue.submit("U1", "views.publish", view("b"))
+    wait_for(queue, published=2)
+    assert [call[1] for call in client.calls] == [view("a"), view("b")]
+
+
+def test_rate_limited_view_is_sent_again():
+    client = FakeClient(rate_limited=1)
+    queue = make_queue(client)
+    queue.submit("U1", "views.publish", view("a"))
+    wait_for(queue, published=1)
+    assert client.calls == [("U1", view("a"))] * 2
+    assert queue.stats()["rate_limited"] == 1 and queue.stats()["failed"] == 0
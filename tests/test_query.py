@@ -0,0 +1,45 @@
+import pytest
+
+from cluster.query import find_jobs, find_nodes, get_node_index, parse_query
+from cluster.job_index import get_job_index
+from cluster.snapshot import ClusterSnapshot
+from run import setup
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    node_dict, job_dict = setup("small")
+    for job_info in list(job_dict.values())[:10]:
+        job_info.partition = "GPU-Big"
+    return ClusterSnapshot(node_dict, job_dict)
+
+
+def jobs(snapshot, text):
+    return find_jobs(snapshot, parse_query(text, "jobs", get_job_index(snapshot)))
+
+
+def nodes(snapshot, text):
+    return find_nodes(snapshot, parse_query(text, "nodes", get_node_index(snapshot)))
+
+
+def test_mixed_case_partition(snapshot):
+    assert len(jobs(snapshot, "partition:GPU-Big")) == 10
+    assert len(jobs(snapshot, "GPU-Big")) == 10
+    assert len(jobs(snapshot, "State:PENDING GPU-Big")) == sum(entry.job_info.job_state == "PENDING" for entry in jobs(snapshot, "GPU-Big"))
+
+
+def test_node_state_flags(snapshot):
+    draining = {name for name, value_dict in snapshot.node_dict.items() if "DRAIN" in value_dict["state"] and value_dict["gres"]}
+    assert draining and {entry.name for entry in nodes(snapshot, "state:drain")} == draining
+    assert {entry.name for entry in nodes(snapshot, "state:mix")} >= {name for name in draining if snapshot.node_dict[name]["state"].startswith("MIXED")}
+
+
+def test_runtime_is_strict_with_gt(snapshot):
+    running = jobs(snapshot, "running")
+    running[0].job_info.run_time = 3600  # exactly at the bound
+    assert running[0] in jobs(snapshot, "running runtime>=60m")
+    assert running[0] not in jobs(snapshot, "running runtime>60m")
+    assert str(parse_query("runtime>2d", "jobs", get_job_index(snapshot))) == "runtime>2d"
+    assert str(parse_query("runtime>=90m", "jobs", get_job_index(snapshot))) == "runtime>=90m"
+    assert str(parse_query("runtime>=61s", "jobs", get_job_index(snapshot))) == "runtime>=61s"
+    assert str(parse_query("runtime>60s", "jobs", get_job_index(snapshot))) == "runtime>1m"
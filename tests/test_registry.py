@@ -0,0 +1,25 @@
+import pytest
+
+import config
+from cluster import registry
+
+
+@pytest.fixture
+def clusters(monkeypatch):
+    def configure(clusters):
+        monkeypatch.setattr(config, "CLUSTERS", clusters)
+        monkeypatch.setattr(registry, "_clusters", None)
+        return registry.get_clusters()
+    return configure
+
+
+def test_default_and_remote_clusters(clusters):
+    clusters({"triton": {}, "saturn": {"slurm_conf": "/etc/slurm/saturn.conf"}})
+    assert registry.get_cluster().name == "triton"
+    assert registry.get_cluster("saturn").remote and not registry.get_cluster().remote
+    assert registry.get_local_cluster().name == "triton"
+
+
+def test_one_cluster_polled_in_process(clusters):
+    with pytest.raises(ValueError):
+        clusters({"triton": {}, "saturn": {}})
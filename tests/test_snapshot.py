@@ -0,0 +1,21 @@
+import time
+
+import pyslurm  # the fake one, see conftest.py
+
+from cluster.query_slurm import get_slum_user_job_dict
+from cluster.snapshot import ClusterSnapshot, get_user_job_dict
+from run import setup
+
+
+def test_user_jobs_from_a_fresh_snapshot_or_from_slurm():
+    node_dict, job_dict = setup("small")
+    user, jobs = next(iter(ClusterSnapshot(node_dict, job_dict).jobs_by_user.items()))
+    fresh = ClusterSnapshot(node_dict, job_dict)
+    assert get_user_job_dict(user, fresh) is fresh.jobs_by_user[user]
+
+    stale = ClusterSnapshot(node_dict, job_dict, created_at=time.time() - 3600)
+    get_slum_user_job_dict.cache_clear()
+    calls = get_slum_user_job_dict.cache_info()["loads"]
+    assert get_user_job_dict(user, stale) == jobs
+    assert get_slum_user_job_dict.cache_info()["loads"] == calls + 1
+    assert get_user_job_dict("nobody-at-all", stale) == {}
@@ -0,0 +1,14 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_app_imports_no_heavy_modules(tmp_path):
+    code = ("import sys, app; "
+            "print(' '.join(m for m in ('pyslurm', 'numpy', 'rapidfuzz', 'unidecode', 'iopath', 'tabulate') if m in sys.modules))")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(ROOT, "benchmarks", "fake_pyslurm"), ROOT]))
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
@@ -0,0 +1,43 @@
+from utils.table import CODE_FENCE, MAX_TEXT_LENGTH, Table
+
+
+def make_table(num_rows, width=40):
+    table = Table(["name", "value"], align="<>")
+    for i in range(num_rows):
+        table.add_row([f"row{i}".ljust(width, "x"), i])
+    return table
+
+
+def test_chunks_fit_a_text_object():
+    chunks = make_table(1000).chunks()
+    assert len(chunks) > 1
+    assert all(len(chunk.encode()) <= MAX_TEXT_LENGTH for chunk in chunks)
+    assert all(chunk.startswith(CODE_FENCE + "name") and chunk.endswith(CODE_FENCE) for chunk in chunks)
+    rows = [line for chunk in chunks for line in chunk[len(CODE_FENCE):-len(CODE_FENCE)].split("\n")[1:]]
+    assert rows == make_table(1000).lines()
+
+
+def test_long_lines_are_cut():
+    for width in (2990, 2995, 5000):
+        chunks = make_table(3, width=width).chunks()
+        assert len(chunks) == 3
+        assert all(len(chunk.encode()) <= MAX_TEXT_LENGTH for chunk in chunks)
+        assert all(chunk[:-len(CODE_FENCE)].split("\n")[1].endswith("…") for chunk in chunks)
+    chunks = make_table(3, width=5000).chunks(limit=100)
+    assert all(len(chunk.encode()) <= 100 for chunk in chunks)
+
+
+def test_max_chunks_counts_the_lines_left_out():
+    chunks = make_table(1000).chunks(max_chunks=3)
+    assert len(chunks) == 3
+    assert len(chunks[-1].encode()) <= MAX_TEXT_LENGTH
+    shown = sum(chunk.count("\n") for chunk in chunks) - 1  # minus the note
+    note = chunks[-1][:-len(CODE_FENCE)].split("\n")[-1]
+    assert note == f"… {1000 - shown} more lines"
+    assert make_table(5).chunks(max_chunks=3) == make_table(5).chunks()
+
+
+def test_empty_columns_are_left_out():
+    table = Table(["a", "b", "c"])
+    table.add_row([1, None, 3])
+    assert table.lines() == ["1  3"]
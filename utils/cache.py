@@ -0,0 +1,196 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from utils.log import get_logger
+from utils.metrics import register_collector
+
+logger = get_logger(__name__)
+
+_CACHES = {}
+
+
+def _make_key(args, kwargs):
+    return args + tuple(sorted(kwargs.items())) if kwargs else args
+
+
+def _is_empty(value):
+    try:
+        return len(value) == 0
+    except TypeError:
+        return value is None
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value, expires_at):
+        self.value = value
+        self.expires_at = expires_at
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe cache of `loader(*args, **kwargs)` results with one entry per argument key.
+
+    - Entries expire after `ttl` seconds, results for which `is_negative(value)` holds
+      (by default empty results) after `negative_ttl` seconds.
+    - Concurrent misses for the same key are collapsed into a single call to `loader` (single-flight),
+      the other callers wait for and share its result.
+    - At most `maxsize` entries are kept, the least recently used one is evicted first.
+    - With `stale_while_revalidate`, an expired entry is still returned immediately while a
+      background thread reloads it.
+
+    Exceptions raised by the loader are passed on to every waiting caller and are not cached.
+    Entries are keyed by the call arguments, or by `key(*args, **kwargs)` if given.
+    """
+
+    def __init__(self, loader, ttl, maxsize=128, negative_ttl=None, stale_while_revalidate=False, is_negative=_is_empty, name=None, key=None):
+        self.loader = loader
+        self.key = key
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.maxsize = maxsize
+        self.stale_while_revalidate = stale_while_revalidate
+        self.is_negative = is_negative
+        self.name = name or getattr(loader, "__qualname__", repr(loader))
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._stats = dict(hits=0, stale_hits=0, misses=0, loads=0, load_errors=0, load_time=0., evictions=0)
+        _CACHES[self.name] = self
+
+    def _key(self, args, kwargs):
+        return self.key(*args, **kwargs) if self.key is not None else _make_key(args, kwargs)
+
+    def get(self, *args, **kwargs):
+        key = self._key(args, kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if time.time() < entry.expires_at:
+                    self._stats["hits"] += 1
+                    return entry.value
+                if self.stale_while_revalidate:
+                    self._stats["stale_hits"] += 1
+                    if key not in self._flights:
+                        flight = self._flights[key] = _Flight()
+                        threading.Thread(target=self._load, args=(key, flight, args, kwargs), name=f"cache-refresh-{self.name}", daemon=True).start()
+                    return entry.value
+            self._stats["misses"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            self._load(key, flight, args, kwargs)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _load(self, key, flight, args, kwargs):
+        start = time.time()
+        try:
+            value = self.loader(*args, **kwargs)
+        except Exception as e:
+            flight.error = e
+            logger.error(f"Failed to load cache entry {self.name}{key}: {e!r}")
+        else:
+            flight.value = value
+        load_time = time.time() - start
+
+        with self._lock:
+            self._stats["loads"] += 1
+            self._stats["load_time"] += load_time
+            if flight.error is None:
+                ttl = self.negative_ttl if self.is_negative(flight.value) else self.ttl
+                self._entries[key] = _Entry(flight.value, time.time() + ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+            else:
+                self._stats["load_errors"] += 1
+            del self._flights[key]
+        flight.done.set()
+
+    def put(self, value, *args, expires_at=None, **kwargs):
+        """Stores `value` for the given arguments, e.g. to warm the cache from disk. Pass `expires_at=0` to store it as stale."""
+        key = self._key(args, kwargs)
+        with self._lock:
+            self._entries[key] = _Entry(value, time.time() + self.ttl if expires_at is None else expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, *args, **kwargs):
+        with self._lock:
+            self._entries.pop(self._key(args, kwargs), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        with self._lock:
+            info = dict(self._stats, size=len(self._entries), maxsize=self.maxsize, in_flight=len(self._flights))
+        lookups = info["hits"] + info["stale_hits"] + info["misses"]
+        info["hit_rate"] = (info["hits"] + info["stale_hits"]) / lookups if lookups else 0.
+        info["avg_load_time"] = info["load_time"] / info["loads"] if info["loads"] else 0.
+        return info
+
+
+def cache_for_n_seconds(seconds=1800, maxsize=128, negative_seconds=None, stale_while_revalidate=False, key=None):
+    """
+    Decorator caching the results of a function per argument key for `seconds` seconds, see TTLCache.
+    The cache is available as `func.cache`, its counters through `func.cache_info()`.
+    """
+    def decorator_cache_for_n_seconds(func):
+        cache = TTLCache(func, ttl=seconds, maxsize=maxsize, negative_ttl=negative_seconds,
+                         stale_while_revalidate=stale_while_revalidate, name=f"{func.__module__}.{func.__qualname__}", key=key)
+
+        @functools.wraps(func)
+        def wrapper_cache_for_n_seconds(*args, **kwargs):
+            return cache.get(*args, **kwargs)
+
+        wrapper_cache_for_n_seconds.cache = cache
+        wrapper_cache_for_n_seconds.cache_info = cache.info
+        wrapper_cache_for_n_seconds.cache_clear = cache.clear
+        return wrapper_cache_for_n_seconds
+    return decorator_cache_for_n_seconds
+
+
+def get_cache_stats():
+    """Counters of every cache created in this process, keyed by cache name."""
+    return {name: cache.info() for name, cache in _CACHES.items()}
+
+
+def _collect_cache_metrics():
+    stats = get_cache_stats()
+    return [
+        ("susbot_cache_lookups_total", "counter", "Cache lookups by result",
+         [({"cache": name, "result": result}, info[key]) for name, info in stats.items() for result, key in [("hit", "hits"), ("stale_hit", "stale_hits"), ("miss", "misses")]]),
+        ("susbot_cache_load_errors_total", "counter", "Cache loads that raised", [({"cache": name}, info["load_errors"]) for name, info in stats.items()]),
+        ("susbot_cache_evictions_total", "counter", "Entries evicted by the size bound", [({"cache": name}, info["evictions"]) for name, info in stats.items()]),
+        ("susbot_cache_load_seconds_total", "counter", "Time spent loading cache entries", [({"cache": name}, info["load_time"]) for name, info in stats.items()]),
+        ("susbot_cache_size", "gauge", "Entries in the cache", [({"cache": name}, info["size"]) for name, info in stats.items()]),
+    ]
+
+
+register_collector(_collect_cache_metrics)
@@ -2,20 +2,28 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 import atexit
 import functools
+import gzip
+import json
 import logging
 import os
+import queue
+import shutil
 import sys
+import threading
 import time
 from collections import Counter
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
 
-from tabulate import tabulate
-from termcolor import colored
-from iopath.common.file_io import PathManager as PathManagerBase
 from config import LOGGER_PREFIX
 
 
-PathManager = PathManagerBase()
+# iopath, tabulate and termcolor are imported on first use, not by every module calling get_logger
+@functools.lru_cache()
+def get_path_manager():
+    from iopath.common.file_io import PathManager as PathManagerBase
+    return PathManagerBase()
+
 
 def get_logger(name):
     if name != '' and not name.startswith(f'{LOGGER_PREFIX}.'):
@@ -33,7 +41,10 @@ class _ColorfulFormatter(logging.Formatter):
         super(_ColorfulFormatter, self).__init__(*args, **kwargs)
 
     def formatMessage(self, record):
-        record.name = record.name.replace(self._root_name, self._abbrev_name)
+        from termcolor import colored
+
+        # on a copy, the same record goes to the file handler next
+        record = logging.makeLogRecord({**record.__dict__, "name": record.name.replace(self._root_name, self._abbrev_name)})
         log = super(_ColorfulFormatter, self).formatMessage(record)
         if record.levelno == logging.WARNING:
             prefix = colored("WARNING", "red", attrs=["blink"])
@@ -44,9 +55,69 @@ class _ColorfulFormatter(logging.Formatter):
         return prefix + " " + log
 
 
+# attributes every LogRecord has, the others were passed in `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class _JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, with the fields passed in `extra` as keys, e.g.
+    `logger.debug("...", extra={"seconds": 0.12, "cluster": "triton"})`.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **{key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS},
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Enqueues records without blocking, the ones logged while the queue is full are dropped and counted."""
+
+    def __init__(self, queue_size):
+        super().__init__(queue.Queue(queue_size))
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def collect(self):
+        return [("susbot_log_records_dropped", "counter", "Log records dropped because the logging queue was full", [({}, self.dropped)])]
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _rotating_file_handler(filename, max_bytes, when, backup_count):
+    """Rotated at `max_bytes`, or at `when` if `max_bytes` is 0, the rotated files are gzipped"""
+    if max_bytes:
+        handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+    else:
+        handler = TimedRotatingFileHandler(filename, when=when, backupCount=backup_count, delay=True)
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = _gzip_rotator
+    return handler
+
+
 @functools.lru_cache()  # so that calling setup_logger multiple times won't add many handlers
 def setup_logger(
-        output=None, level=logging.INFO, distributed_rank=0, *, color=True, name=LOGGER_PREFIX, abbrev_name=None
+        output=None, level=logging.INFO, distributed_rank=0, *, color=True, name=LOGGER_PREFIX, abbrev_name=None,
+        queue_size=0, max_bytes=0, when="midnight", backup_count=0, json_output=False
 ):
     """
     Initialize the detectron2 logger and set its verbosity level to "DEBUG".
@@ -60,6 +131,12 @@ def setup_logger(
             Set to "" to not log the root module in logs.
             By default, will abbreviate "detectron2" to "d2" and leave other
             modules unchanged.
+        queue_size (int): if > 0, log calls only enqueue the record and the handlers run
+            on a listener thread. Records logged while the queue is full are dropped.
+        max_bytes, when, backup_count: rotation of a local log file, at `max_bytes` or
+            at `when` if `max_bytes` is 0, keeping `backup_count` gzipped files.
+            Not rotated if both `max_bytes` and `backup_count` are 0.
+        json_output (bool): write the log file as JSON lines, see `_JsonFormatter`.
 
     Returns:
         logging.Logger: a logger
@@ -74,11 +151,14 @@ def setup_logger(
     plain_formatter = logging.Formatter(
         "[%(asctime)s] %(name)s %(levelname)s: %(message)s", datefmt="%m/%d %H:%M:%S"
     )
+    handlers = []
     # stdout logging: master only
     if distributed_rank == 0:
         ch = logging.StreamHandler(stream=sys.stdout)
         ch.setLevel(level)
         if color:
+            from termcolor import colored
+
             formatter = _ColorfulFormatter(
                 colored("[%(asctime)s %(levelname)s %(name)s]: ", "green") + "%(message)s",
                 datefmt="%m/%d %H:%M:%S",
@@ -88,7 +168,7 @@ def setup_logger(
         else:
             formatter = plain_formatter
         ch.setFormatter(formatter)
-        logger.addHandler(ch)
+        handlers.append(ch)
 
     # file logging: all workers
     if output is not None:
@@ -98,12 +178,30 @@ def setup_logger(
             filename = os.path.join(output,  f"log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
         if distributed_rank > 0:
             filename = filename + ".rank{}".format(distributed_rank)
-        PathManager.mkdirs(os.path.dirname(filename))
+        if "://" in filename:
+            get_path_manager().mkdirs(os.path.dirname(filename))
+        else:
+            os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
 
-        fh = logging.StreamHandler(_cached_log_stream(filename))
+        if "://" in filename or not (max_bytes or backup_count):
+            fh = logging.StreamHandler(_cached_log_stream(filename))
+        else:
+            fh = _rotating_file_handler(filename, max_bytes, when, backup_count)
         fh.setLevel(logging.DEBUG)
-        fh.setFormatter(plain_formatter)
-        logger.addHandler(fh)
+        fh.setFormatter(_JsonFormatter() if json_output else plain_formatter)
+        handlers.append(fh)
+
+    if queue_size > 0:
+        from utils.metrics import register_collector
+
+        qh = _DroppingQueueHandler(queue_size)
+        listener = QueueListener(qh.queue, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)  # writes out the records still queued
+        register_collector(qh.collect)
+        handlers = [qh]
+    for handler in handlers:
+        logger.addHandler(handler)
 
     return logger
 
@@ -113,7 +211,7 @@ def setup_logger(
 @functools.lru_cache(maxsize=None)
 def _cached_log_stream(filename):
     # use 1K buffer if writing to cloud storage
-    io = PathManager.open(filename, "a", buffering=1024 if "://" in filename else -1)
+    io = get_path_manager().open(filename, "a", buffering=1024) if "://" in filename else open(filename, "a")
     atexit.register(io.close)
     return io
 
@@ -128,20 +226,20 @@ https://github.com/abseil/abseil-py/blob/master/absl/logging/__init__.py
 def _find_caller():
     """
     Returns:
-        str: module name of the caller
+        str: logger name of the caller's module, under LOGGER_PREFIX like `get_logger(__name__)`
         tuple: a hashable key to be used to identify different callers
     """
     frame = sys._getframe(2)
     while frame:
-        code = frame.f_code
-        if os.path.join("utils", "log") not in code.co_filename:
+        if frame.f_globals is not _GLOBALS:  # identity check, no string work per frame
+            code = frame.f_code
             mod_name = frame.f_globals["__name__"]
-            if mod_name == "__main__":
-                mod_name = LOGGER_PREFIX
+            mod_name = LOGGER_PREFIX if mod_name == "__main__" else get_logger(mod_name).name
             return mod_name, (code.co_filename, frame.f_lineno, code.co_name)
         frame = frame.f_back
 
 
+_GLOBALS = globals()
 _LOG_COUNTER = Counter()
 _LOG_TIMER = {}
 
@@ -226,6 +324,8 @@ def create_small_table(small_dict):
     Returns:
         str: the table as a string.
     """
+    from tabulate import tabulate
+
     keys, values = tuple(zip(*small_dict.items()))
     table = tabulate(
         [values],
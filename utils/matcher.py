@@ -0,0 +1,268 @@
+import re
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from unidecode import unidecode
+
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+MATCH_THRESHOLD = 75
+IGNORED_SLACK_IDS = {'U01UCDZ1RT3'}
+NUM_SEEDS = 16
+MAX_INCREMENTAL_CHANGES = 64
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# characters are binned (a-z, digits, space, rest) for the score upper bound, binning only loosens the bound
+_CHAR_BINS = np.full(256, 28, dtype=np.int64)
+_CHAR_BINS[ord('a'):ord('z') + 1] = np.arange(26)
+_CHAR_BINS[ord('0'):ord('9') + 1] = 26
+_CHAR_BINS[ord(' ')] = 27
+NUM_CHAR_BINS = 29
+
+
+def normalize_name(name):
+    full = unidecode(name.lower())
+    first, _, last = full.rpartition(' ')
+    return full, first, last
+
+
+def _char_hist(s):
+    return np.bincount(_CHAR_BINS[np.frombuffer(s.encode('ascii', 'replace'), dtype=np.uint8)], minlength=NUM_CHAR_BINS)
+
+
+def _grams(s):
+    grams = set()
+    for token in _TOKEN_RE.findall(s):
+        grams.add(token)
+        token = f" {token} "
+        grams.update(token[i:i + 3] for i in range(len(token) - 2))
+    return grams
+
+
+def _partial_ratio_upper_bound(hist, length, hists, lengths):
+    """
+    Upper bound of fuzz.partial_ratio(s, t) for one string s against many strings t, from character counts alone.
+    With m the length of the shorter string and c the number of characters both have in common, every alignment
+    partial_ratio considers has at most c matching characters, so the ratio is at most 2c / (m + c).
+    """
+    common = np.minimum(hists, hist).sum(axis=1)
+    shorter = np.minimum(lengths, length)
+    bound = np.where(shorter > 0, 200. * common / np.maximum(shorter + common, 1), 100.)
+    return bound + 0.5  # thefuzz rounds the ratio
+
+
+class IdentityMatcher:
+    """
+    Matches passwd entries to Slack users by the fuzzy similarity of the gecos and Slack full names:
+
+        score = partial_ratio(full names) + partial_ratio(first names) / 4 + partial_ratio(surnames) / 10
+
+    Every Linux user is matched to its best scoring Slack user (the first one in Slack order on ties) if the score
+    is above MATCH_THRESHOLD, and every Slack user keeps the best scoring Linux user (the first one in passwd order
+    on ties). This is the same mapping as scoring every (Linux user, Slack user) pair, but names are normalized once,
+    an inverted token/trigram index provides likely candidates whose scores seed the search, and every other
+    Slack user is only scored if a character count upper bound of its score can still beat the best one.
+
+    Slack users and passwd entries can be updated one at a time, only the Linux users whose best match can change
+    are scored again.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._slack = {}  # slack id -> (real name, normalized name)
+        self._slack_order = []
+        self._index = defaultdict(set)  # token or trigram -> slack ids
+        self._linux = []  # (pw_name, pw_gecos) in passwd order
+        self._linux_names = {}  # (pw_name, pw_gecos) -> normalized name
+        self._best = {}  # (pw_name, pw_gecos) -> (slack id, score) or None
+        self._matrix = None
+        self._mapping = {}
+        self._last_inputs = [None, None]  # last slack user list and passwd entries, to skip unchanged inputs cheaply
+
+    def _add_slack_user(self, user):
+        if user['id'] in IGNORED_SLACK_IDS or 'real_name' not in user:
+            return False
+        name = normalize_name(user['real_name'])
+        self._slack[user['id']] = (user['real_name'], name)
+        for gram in _grams(name[0]):
+            self._index[gram].add(user['id'])
+        return True
+
+    def _remove_slack_user(self, slack_id):
+        if slack_id not in self._slack:
+            return False
+        _, name = self._slack.pop(slack_id)
+        for gram in _grams(name[0]):
+            self._index[gram].discard(slack_id)
+        return True
+
+    def _get_matrix(self):
+        # character histograms and lengths of all slack names, rebuilt lazily after slack users changed
+        if self._matrix is None:
+            ids = [slack_id for slack_id in self._slack_order if slack_id in self._slack]
+            names = [self._slack[slack_id][1] for slack_id in ids]
+            self._matrix = (ids, [
+                (np.stack([_char_hist(name[i]) for name in names]) if names else np.zeros((0, NUM_CHAR_BINS), dtype=np.int64),
+                 np.array([len(name[i]) for name in names], dtype=np.int64))
+                for i in range(3)])
+        return self._matrix
+
+    def _upper_bounds(self, linux_name):
+        ids, fields = self._get_matrix()
+        bound = np.zeros(len(ids))
+        for i, weight in enumerate((1, 1 / 4, 1 / 10)):
+            hists, lengths = fields[i]
+            bound += weight * _partial_ratio_upper_bound(_char_hist(linux_name[i]), len(linux_name[i]), hists, lengths)
+        return ids, bound
+
+    def _score(self, linux_name, slack_ids):
+        if not slack_ids:
+            return np.zeros(0)
+        names = [self._slack[slack_id][1] for slack_id in slack_ids]
+        scores = np.zeros(len(names))
+        for i, weight in enumerate((1, 1 / 4, 1 / 10)):
+            ratios = process.cdist([linux_name[i]], [name[i] for name in names], scorer=fuzz.partial_ratio, dtype=np.float64)[0]
+            scores += np.round(ratios) * weight
+        return scores
+
+    def _find_best(self, linux_name):
+        seeds = Counter(slack_id for gram in _grams(linux_name[0]) for slack_id in self._index.get(gram, ()))
+        seeds = [slack_id for slack_id, _ in seeds.most_common(NUM_SEEDS)]
+        seed_best = max(self._score(linux_name, seeds), default=-1.)
+
+        ids, bound = self._upper_bounds(linux_name)
+        threshold = max(seed_best, MATCH_THRESHOLD)
+        candidates = [slack_id for slack_id, b in zip(ids, bound) if b >= threshold]
+        best = None
+        # same tie-breaking as scoring every pair: one entry per real name at its first position in slack order
+        per_name = {}
+        for slack_id, score in zip(candidates, self._score(linux_name, candidates)):
+            per_name[self._slack[slack_id][0]] = (slack_id, score)
+        for slack_id, score in per_name.values():
+            if best is None or score > best[1]:
+                best = (slack_id, float(score))
+        return best if best is not None and best[1] > MATCH_THRESHOLD else None
+
+    def _resolve(self):
+        mapping, mapping_score = {}, {}
+        for key in self._linux:
+            if (match := self._best.get(key)) is not None:
+                slack_id, score = match
+                if slack_id not in mapping_score or mapping_score[slack_id] < score:
+                    mapping_score[slack_id] = score
+                    mapping[slack_id] = key[0]
+        self._mapping = mapping
+
+    def _rematch(self, keys):
+        for key in keys:
+            self._best[key] = self._find_best(self._linux_names[key])
+
+    def _rematch_for_slack_user(self, slack_id):
+        # linux users whose best match was this slack user or who may prefer it now
+        affected = {key for key, match in self._best.items() if match is not None and match[0] == slack_id}
+        if slack_id in self._slack:
+            new_name = self._slack[slack_id][1]
+            for key in self._linux:
+                if key in affected:
+                    continue
+                best_score = self._best[key][1] if self._best.get(key) is not None else MATCH_THRESHOLD
+                ub = sum(weight * _partial_ratio_upper_bound(_char_hist(self._linux_names[key][i]), len(self._linux_names[key][i]),
+                                                             _char_hist(new_name[i])[None], np.array([len(new_name[i])]))[0]
+                         for i, weight in enumerate((1, 1 / 4, 1 / 10)))
+                if ub >= best_score:
+                    affected.add(key)
+        self._rematch(affected)
+        return len(affected)
+
+    def set_slack_users(self, slack_users):
+        """Replaces the Slack users, scoring again only the Linux users affected by changed users if there are few of them."""
+        with self._lock:
+            if slack_users is self._last_inputs[0]:
+                return self._mapping
+            self._last_inputs[0] = slack_users
+            new = {user['id']: user for user in slack_users if user['id'] not in IGNORED_SLACK_IDS and 'real_name' in user}
+            changed = [slack_id for slack_id in new.keys() | self._slack.keys()
+                       if slack_id not in new or slack_id not in self._slack or new[slack_id]['real_name'] != self._slack[slack_id][0]]
+            order = [user['id'] for user in slack_users]
+            if not changed and order == self._slack_order:
+                return self._mapping
+
+            # incremental updates keep the tie-breaking order only if the unchanged users kept their relative order
+            kept = [slack_id for slack_id in order if slack_id in new and slack_id in self._slack]
+            full_rebuild = len(changed) > MAX_INCREMENTAL_CHANGES or kept != [slack_id for slack_id in self._slack_order if slack_id in new and slack_id in self._slack]
+            for slack_id in changed:
+                self._remove_slack_user(slack_id)
+                if slack_id in new:
+                    self._add_slack_user(new[slack_id])
+            self._slack_order = order
+            self._matrix = None
+            if full_rebuild:
+                self._rematch(self._linux)
+            else:
+                for slack_id in changed:
+                    self._rematch_for_slack_user(slack_id)
+            self._resolve()
+            logger.info(f"Matched {len(self._linux)} linux users against {len(self._slack)} slack users "
+                        f"({'full rebuild' if full_rebuild else f'{len(changed)} changed'}), {len(self._mapping)} mapped")
+            return self._mapping
+
+    def update_slack_user(self, user):
+        """Adds or updates a single Slack user, e.g. from a `user_change` or `team_join` event."""
+        with self._lock:
+            old = self._slack.get(user['id'])
+            if old is not None and old[0] == user.get('real_name'):
+                return self._mapping
+            self._remove_slack_user(user['id'])
+            if self._add_slack_user(user) and user['id'] not in self._slack_order:
+                self._slack_order.append(user['id'])
+            self._matrix = None
+            num_affected = self._rematch_for_slack_user(user['id'])
+            self._resolve()
+            logger.info(f"Updated slack user {user['id']}, {num_affected} linux users matched again")
+            return self._mapping
+
+    def set_linux_users(self, passwd_entries):
+        """Replaces the passwd entries, only new or changed entries are matched."""
+        with self._lock:
+            if passwd_entries is self._last_inputs[1]:
+                return self._mapping
+            self._last_inputs[1] = passwd_entries
+            linux = [(entry.pw_name, entry.pw_gecos) for entry in passwd_entries if not (entry.pw_uid < 100 or entry.pw_name.startswith('.'))]
+            if linux == self._linux:
+                return self._mapping
+            new_keys = [key for key in linux if key not in self._linux_names]
+            self._linux_names = {key: self._linux_names.get(key) or normalize_name(key[1]) for key in linux}
+            self._best = {key: match for key, match in self._best.items() if key in self._linux_names}
+            self._linux = linux
+            self._rematch(new_keys)
+            self._resolve()
+            return self._mapping
+
+    def export_state(self):
+        with self._lock:
+            return {
+                "slack": [[slack_id, self._slack[slack_id][0]] for slack_id in self._slack_order if slack_id in self._slack],
+                "linux": [[*key, *(self._best.get(key) or (None, None))] for key in self._linux],
+            }
+
+    def import_state(self, state):
+        """Restores the users and best matches of `export_state()` without scoring anything."""
+        with self._lock:
+            self._slack, self._index, self._matrix = {}, defaultdict(set), None
+            for slack_id, real_name in state["slack"]:
+                self._add_slack_user({"id": slack_id, "real_name": real_name})
+            self._slack_order = [slack_id for slack_id, _ in state["slack"]]
+            self._linux = [(pw_name, pw_gecos) for pw_name, pw_gecos, _, _ in state["linux"]]
+            self._linux_names = {key: normalize_name(key[1]) for key in self._linux}
+            self._best = {(pw_name, pw_gecos): (slack_id, score) if slack_id is not None else None
+                          for pw_name, pw_gecos, slack_id, score in state["linux"]}
+            self._last_inputs = [None, None]
+            self._resolve()
+
+    def mapping(self):
+        """slack id -> unix user name"""
+        return self._mapping
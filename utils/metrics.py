@@ -0,0 +1,240 @@
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30.)
+SIZE_BUCKETS = (1e3, 3e3, 1e4, 3e4, 1e5, 3e5, 1e6, 3e6)
+
+_METRICS = []
+_COLLECTORS = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = [*zip(labelnames, labelvalues), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """
+    A metric with one child per label value combination. Updates only touch the child under its own lock,
+    the text format is only built when `/metrics` is scraped.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        _METRICS.append(self)
+
+    def labels(self, *labelvalues):
+        if (child := self._children.get(labelvalues)) is None:
+            with self._lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labelvalues, child in list(self._children.items()):
+            lines.extend(child.samples(self.name, self.labelnames, labelvalues))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.):
+        with self._lock:
+            self._value += amount
+
+    def samples(self, name, labelnames, labelvalues):
+        return [f"{name}_total{_format_labels(labelnames, labelvalues)} {self._value}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.):
+        self.labels().inc(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("_buckets", "_counts", "_sum", "_lock")
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def samples(self, name, labelnames, labelvalues):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        lines, cumulative = [], 0
+        for bound, count in zip([*self._buckets, float("inf")], counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_format_labels(labelnames, labelvalues, [('le', le)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, labelvalues)} {total}")
+        lines.append(f"{name}_count{_format_labels(labelnames, labelvalues)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._start)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+def timed(histogram, *labelvalues, errors=None):
+    """
+    Decorator observing the run time of every call in `histogram`, and counting the calls that raised in the
+    `errors` counter with the same labels. Works for coroutine functions too.
+    """
+    def decorator(func):
+        child = histogram.labels(*labelvalues)
+        error_child = errors.labels(*labelvalues) if errors is not None else None
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException:
+                    if error_child is not None:
+                        error_child.inc()
+                    raise
+                finally:
+                    child.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                if error_child is not None:
+                    error_child.inc()
+                raise
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def register_collector(collect):
+    """
+    `collect()` is called on every scrape and returns (name, type, documentation, [(labels dict, value)]) tuples,
+    for values that are cheaper to read when asked for than to keep updated (cache counters, snapshot age, ...).
+    """
+    _COLLECTORS.append(collect)
+
+
+def generate_latest():
+    lines = []
+    for metric in list(_METRICS):
+        lines.extend(metric.collect())
+    for collect in list(_COLLECTORS):
+        try:
+            for name, metric_type, documentation, samples in collect():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {float(value)}")
+        except Exception:
+            logger.exception(f"Metrics collector {collect} failed")
+    return ("\n".join(lines) + "\n").encode()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        payload = generate_latest()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port, addr="127.0.0.1"):
+    """Serves the metrics in Prometheus text format on http://`addr`:`port`/metrics from a daemon thread."""
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics on http://{addr}:{server.server_address[1]}/metrics")
+    return server
+
+
+# shared by app.py/app_async.py and every module calling the Slack Web API
+HANDLER_SECONDS = Histogram("susbot_handler_seconds", "Time spent in a Slack handler", ["handler"])
+HANDLER_ERRORS = Counter("susbot_handler_errors", "Slack handlers that raised", ["handler"])
+PAYLOAD_BYTES = Histogram("susbot_payload_bytes", "Size of the rendered views and messages", ["kind"], buckets=SIZE_BUCKETS)
+SLACK_API_SECONDS = Histogram("susbot_slack_api_seconds", "Latency of Slack Web API calls", ["method"])
+SLACK_API_ERRORS = Counter("susbot_slack_api_errors", "Failed Slack Web API calls", ["method", "error"])
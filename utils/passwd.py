@@ -0,0 +1,125 @@
+import os
+import pwd
+import threading
+import time
+
+import config
+from utils.log import get_logger
+from utils.persist import register_state
+
+logger = get_logger(__name__)
+
+
+class PasswdIndex:
+    """
+    In-memory uid <-> user name index over the passwd database.
+
+    The database is enumerated in bulk with `pwd.getpwall` and reloaded when `passwd_file` changes
+    or, for NSS backends (LDAP/SSSD) whose changes do not touch the file, after `ttl` seconds.
+    The file is stat-ed at most once every `check_interval` seconds.
+    Uids missing from the enumeration are looked up once with `pwd.getpwuid` and memoized,
+    unknown uids resolve to the uid as a string instead of raising KeyError.
+    """
+
+    def __init__(self, passwd_file=config.PASSWD_FILE, ttl=config.PASSWD_TTL, check_interval=5):
+        self.passwd_file = passwd_file
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._entries = []
+        self._by_uid = {}
+        self._by_name = {}
+        self._mtime = None
+        self._loaded_at = 0.
+        self._checked_at = 0.
+
+    def _get_mtime(self):
+        try:
+            return os.stat(self.passwd_file).st_mtime
+        except OSError:
+            return None
+
+    def _maybe_reload(self):
+        now = time.time()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            mtime = self._get_mtime()
+            if self.version > 0 and mtime == self._mtime and now - self._loaded_at < self.ttl:
+                return
+            start = time.time()
+            entries = pwd.getpwall()
+            self._by_uid = {entry.pw_uid: entry for entry in reversed(entries)}
+            self._by_name = {entry.pw_name: entry for entry in reversed(entries)}
+            self._entries = entries
+            self._mtime, self._loaded_at = mtime, now
+            self.version += 1
+            logger.debug(f"Loaded {len(entries)} passwd entries in {time.time() - start:.2f}s", extra={"seconds": round(time.time() - start, 4)})
+
+    def export_state(self):
+        if self.version == 0:
+            return None
+        return {"entries": [list(entry) for entry in self._entries], "mtime": self._mtime, "loaded_at": self._loaded_at}
+
+    def import_state(self, state):
+        """Restores the entries of `export_state()`, they are reloaded as usual once the passwd file changes or the TTL expires."""
+        entries = [pwd.struct_passwd(entry) for entry in state["entries"]]
+        with self._lock:
+            self._by_uid = {entry.pw_uid: entry for entry in reversed(entries)}
+            self._by_name = {entry.pw_name: entry for entry in reversed(entries)}
+            self._entries = entries
+            self._mtime, self._loaded_at = state["mtime"], state["loaded_at"]
+            self._checked_at = 0.
+            self.version += 1
+
+    def get(self, uid):
+        """
+        Returns:
+            pwd.struct_passwd or None: the passwd entry of `uid`
+        """
+        self._maybe_reload()
+        if uid in self._by_uid:
+            return self._by_uid[uid]
+        try:
+            entry = pwd.getpwuid(uid)
+        except KeyError:
+            entry = None
+        self._by_uid[uid] = entry
+        return entry
+
+    def name(self, uid):
+        entry = self.get(uid)
+        return entry.pw_name if entry is not None else str(uid)
+
+    def uid(self, name):
+        self._maybe_reload()
+        if name in self._by_name:
+            entry = self._by_name[name]
+        else:
+            try:
+                entry = pwd.getpwnam(name)
+            except KeyError:
+                entry = None
+            self._by_name[name] = entry
+        return entry.pw_uid if entry is not None else None
+
+    def entries(self):
+        self._maybe_reload()
+        return self._entries
+
+
+_passwd_index = None
+
+
+def get_passwd_index():
+    global _passwd_index
+    if _passwd_index is None:
+        _passwd_index = PasswdIndex()
+    return _passwd_index
+
+
+register_state("passwd", lambda: get_passwd_index().export_state(), lambda state: get_passwd_index().import_state(state))
@@ -0,0 +1,100 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+import config
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+STATE_VERSION = 1
+
+_providers = {}
+
+
+def register_state(name, export_state, import_state):
+    """
+    Registers a component whose state is kept across restarts.
+    `export_state()` returns a JSON serializable object, `import_state(obj)` restores it.
+    """
+    _providers[name] = (export_state, import_state)
+
+
+def write_state_file(path, state):
+    """Writes `state` as compact JSON, atomically: readers see either the old or the new file, never a partial one."""
+    dirname = os.path.dirname(path) or "."
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".state-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": STATE_VERSION, "saved_at": time.time(), "state": state}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_state_file(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable state file {path}: {e}")
+        return None
+    if data.get("version") != STATE_VERSION:
+        logger.warning(f"Ignoring state file {path} with version {data.get('version')}, expected {STATE_VERSION}")
+        return None
+    return data
+
+
+def save_state(path=config.STATE_FILE):
+    start = time.time()
+    state = {}
+    for name, (export_state, _) in _providers.items():
+        try:
+            if (value := export_state()) is not None:
+                state[name] = value
+        except Exception:
+            logger.exception(f"Failed to export {name} state")
+    try:
+        write_state_file(path, state)
+    except OSError as e:
+        logger.error(f"Failed to save state to {path}: {e}")
+        return
+    logger.debug(f"Saved {','.join(state)} state to {path} in {time.time() - start:.2f}s", extra={"seconds": round(time.time() - start, 4)})
+
+
+def restore_state(path=config.STATE_FILE):
+    """Restores every registered component found in the state file. Returns the names of the restored components."""
+    start = time.time()
+    if (data := read_state_file(path)) is None:
+        return []
+    restored = []
+    for name, value in data["state"].items():
+        if name not in _providers:
+            continue
+        try:
+            _providers[name][1](value)
+            restored.append(name)
+        except Exception:
+            logger.exception(f"Failed to restore {name} state")
+    logger.info(f"Restored {','.join(restored)} state saved at {time.strftime('%m/%d %H:%M:%S', time.localtime(data['saved_at']))} in {time.time() - start:.2f}s", extra={"seconds": round(time.time() - start, 4)})
+    return restored
+
+
+def start_autosave(path=config.STATE_FILE, interval=config.STATE_SAVE_INTERVAL):
+    """Saves the state every `interval` seconds and at exit."""
+    def run():
+        while True:
+            time.sleep(interval)
+            save_state(path)
+
+    threading.Thread(target=run, name="state-autosave", daemon=True).start()
+    atexit.register(save_state, path)
@@ -0,0 +1,331 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+import config
+from utils.log import get_logger, log_every_n_seconds
+from utils.metrics import PAYLOAD_BYTES, SLACK_API_ERRORS, SLACK_API_SECONDS, register_collector
+
+logger = get_logger(__name__)
+
+
+class PublishedViews:
+    """
+    Remembers a fingerprint of the last view published to every user, to skip views.publish/views.update calls
+    that would not change anything. The whole view is fingerprinted: the "Last updated" block only changes with
+    the snapshot, its age is a Slack date token the client keeps current.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fingerprints = {}
+
+    @staticmethod
+    def fingerprint(view):
+        return hashlib.sha1(json.dumps(view, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+    def is_unchanged(self, user_id, view):
+        with self._lock:
+            return self._fingerprints.get(user_id) == self.fingerprint(view)
+
+    def mark_published(self, user_id, view):
+        fingerprint = self.fingerprint(view)
+        with self._lock:
+            self._fingerprints[user_id] = fingerprint
+
+
+class TokenBucket:
+    """`rate` calls per second on average with bursts of up to `burst` calls."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Takes a token, returns how many seconds to wait before using it."""
+        self._refill()
+        self.tokens -= 1
+        return max(0., -self.tokens / self.rate)
+
+    def try_acquire(self):
+        """Takes a token if one is available right now."""
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class _Publish:
+    __slots__ = ("user_id", "method", "view", "kwargs", "submitted_at")
+
+    def __init__(self, user_id, method, view, kwargs, submitted_at):
+        self.user_id = user_id
+        self.method = method
+        self.view = view
+        self.kwargs = kwargs
+        self.submitted_at = submitted_at
+
+
+class _PublishState:
+    """
+    Bookkeeping shared by PublishQueue and AsyncPublishQueue: views pending per user, rate limit buckets, the
+    fingerprints of the views published and the stats. `self._lock` guards `_pending`, `_notify()` wakes a sender.
+    """
+
+    def _init_state(self, rate_limits):
+        self.published_views = PublishedViews()
+        self._buckets = {method: TokenBucket(per_minute / 60., burst) for method, (per_minute, burst) in rate_limits.items()}
+        self._pending = OrderedDict()  # user id -> _Publish
+        self._stats = dict(submitted=0, coalesced=0, unchanged=0, superseded=0, published=0, failed=0, rate_limited=0,
+                           latency_sum=0., latency_max=0.)
+
+    def submit(self, user_id, method, view, **kwargs):
+        """
+        Queues `client.<method>(view=view, **kwargs)` for `user_id`, replacing a view still pending for that user.
+        views.publish is called with `user_id`, views.update needs a `view_id` in `kwargs`.
+        """
+        with self._lock:
+            self._stats["submitted"] += 1
+            if (pending := self._pending.get(user_id)) is not None:
+                self._stats["coalesced"] += 1
+                submitted_at = pending.submitted_at
+            else:
+                submitted_at = time.monotonic()
+            self._pending[user_id] = _Publish(user_id, method, view, kwargs, submitted_at)
+            self._notify()
+
+    def _is_superseded(self, item):
+        with self._lock:
+            if item.user_id in self._pending:
+                self._stats["superseded"] += 1
+                return True
+            return False
+
+    def _is_unchanged(self, item):
+        if self.published_views.is_unchanged(item.user_id, item.view):
+            self._stats["unchanged"] += 1
+            return True
+        return False
+
+    def _call_args(self, item):
+        """(client method name, kwargs) of the Slack call of `item`"""
+        kwargs = dict(item.kwargs, user_id=item.user_id) if item.method == "views.publish" else item.kwargs
+        PAYLOAD_BYTES.labels(item.view.get("type", "view")).observe(len(json.dumps(item.view, separators=(",", ":"))))
+        return item.method.replace(".", "_"), dict(kwargs, view=item.view)
+
+    def _on_error(self, item, e):
+        """Counts a failed call, returns the seconds to wait before sending `item` again if it was rate limited"""
+        SLACK_API_ERRORS.labels(item.method, e.response.get("error") or str(e.response.status_code)).inc()
+        if e.response.status_code == 429:
+            self._stats["rate_limited"] += 1
+            retry_after = int(e.response.headers.get("Retry-After", e.response.headers.get("retry-after", 1)))
+            logger.warning(f"Rate limited on {item.method}, retrying in {retry_after}s")
+            return retry_after
+        self._stats["failed"] += 1
+        logger.error(f"Failed to {item.method} for {item.user_id}: {e.response.get('error')}")
+        return None
+
+    def _retry(self, item):
+        """Puts a rate limited view back at the front, unless it was superseded meanwhile"""
+        with self._lock:
+            if item.user_id not in self._pending:
+                self._pending[item.user_id] = item
+                self._pending.move_to_end(item.user_id, last=False)
+                self._notify()
+
+    def _on_published(self, item):
+        latency = time.monotonic() - item.submitted_at
+        self.published_views.mark_published(item.user_id, item.view)
+        self._stats["published"] += 1
+        self._stats["latency_sum"] += latency
+        self._stats["latency_max"] = max(self._stats["latency_max"], latency)
+        log_every_n_seconds(logging.INFO, f"Publish queue: {self.stats()}", n=60, name=logger.name)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, queue_depth=len(self._pending))
+        stats["latency_avg"] = stats["latency_sum"] / stats["published"] if stats["published"] else 0.
+        return stats
+
+
+class PublishQueue(_PublishState, threading.Thread):
+    """
+    Sends views.publish/views.update calls from a background thread.
+
+    - Pending views of the same user collapse into the latest one, a view superseded while waiting is never sent.
+    - Views identical to the last one published to the user are skipped.
+    - Every method is paced by a token bucket matching its Slack rate limit tier (`config.SLACK_RATE_LIMITS`).
+    - On HTTP 429 the method is paused for the Retry-After seconds and the view is sent again unless superseded.
+
+    `stats()` reports the queue depth and the publish latency, from the first submission to the completed call.
+    """
+
+    def __init__(self, client=None, rate_limits=config.SLACK_RATE_LIMITS):
+        super().__init__(name="slack-publisher", daemon=True)
+        self.client = client or WebClient(token=os.environ.get("SLACK_BOT_TOKEN"))
+        self._lock = threading.Condition()
+        self._notify = self._lock.notify
+        self._init_state(rate_limits)
+
+    def _next(self):
+        with self._lock:
+            while not self._pending:
+                self._lock.wait()
+            return self._pending.popitem(last=False)[1]
+
+    def _send(self, item):
+        if self._is_unchanged(item):
+            return
+        if (bucket := self._buckets.get(item.method)) is not None and (wait := bucket.reserve()) > 0:
+            time.sleep(wait)
+            if self._is_superseded(item):
+                return
+        method, kwargs = self._call_args(item)
+        try:
+            with SLACK_API_SECONDS.labels(item.method).time():
+                getattr(self.client, method)(**kwargs)
+        except SlackApiError as e:
+            if (retry_after := self._on_error(item, e)) is not None:
+                time.sleep(retry_after)
+                self._retry(item)
+            return
+        self._on_published(item)
+
+    def run(self):
+        while True:
+            item = self._next()
+            try:
+                self._send(item)
+            except Exception:
+                self._stats["failed"] += 1
+                logger.exception(f"Failed to {item.method} for {item.user_id}")
+
+
+class AsyncPublishQueue(_PublishState):
+    """
+    PublishQueue of the async app: the same coalescing, dedupe, pacing and 429 handling, with up to `concurrency`
+    calls awaited at once on the event loop through an AsyncWebClient. A user has at most one call in flight, so
+    their views still arrive in order. `submit` may be called from any thread, e.g. by the live home tabs.
+    """
+
+    def __init__(self, client=None, rate_limits=config.SLACK_RATE_LIMITS, concurrency=config.ASYNC_PUBLISH_CONCURRENCY):
+        from slack_sdk.web.async_client import AsyncWebClient
+
+        self.client = client or AsyncWebClient(token=os.environ.get("SLACK_BOT_TOKEN"))
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._in_flight = set()  # users with a call being sent
+        self._tasks = []
+        self._init_state(rate_limits)
+
+    def _notify(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self):
+        """Starts the senders on the running event loop"""
+        import asyncio
+
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [self._loop.create_task(self._run()) for _ in range(self.concurrency)]
+        self._notify()  # views submitted before the loop was known
+
+    async def _next(self):
+        while True:
+            with self._lock:
+                user_id = next((user_id for user_id in self._pending if user_id not in self._in_flight), None)
+                if user_id is not None:
+                    self._in_flight.add(user_id)
+                    return self._pending.pop(user_id)
+                self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _send(self, item):
+        import asyncio
+
+        if self._is_unchanged(item):
+            return
+        if (bucket := self._buckets.get(item.method)) is not None and (wait := bucket.reserve()) > 0:
+            await asyncio.sleep(wait)
+            if self._is_superseded(item):
+                return
+        method, kwargs = self._call_args(item)
+        try:
+            with SLACK_API_SECONDS.labels(item.method).time():
+                await getattr(self.client, method)(**kwargs)
+        except SlackApiError as e:
+            if (retry_after := self._on_error(item, e)) is not None:
+                await asyncio.sleep(retry_after)
+                self._retry(item)
+            return
+        self._on_published(item)
+
+    async def _run(self):
+        while True:
+            item = await self._next()
+            try:
+                await self._send(item)
+            except Exception:
+                self._stats["failed"] += 1
+                logger.exception(f"Failed to {item.method} for {item.user_id}")
+            finally:
+                with self._lock:
+                    self._in_flight.discard(item.user_id)
+                    if item.user_id in self._pending:
+                        self._notify()
+
+
+_publish_queue = None
+_publish_queue_lock = threading.Lock()
+
+
+def _collect_publisher_metrics():
+    if _publish_queue is None:
+        return []
+    stats = _publish_queue.stats()
+    return [
+        ("susbot_publish_queue_depth", "gauge", "Views waiting to be published", [({}, stats["queue_depth"])]),
+        ("susbot_publish_queue_views_total", "counter", "Views submitted to the publish queue by outcome",
+         [({"outcome": outcome}, stats[outcome]) for outcome in ["submitted", "coalesced", "unchanged", "superseded", "published", "failed", "rate_limited"]]),
+        ("susbot_publish_queue_latency_seconds_total", "counter", "Sum of the time from submission to published view", [({}, stats["latency_sum"])]),
+    ]
+
+
+register_collector(_collect_publisher_metrics)
+
+
+def get_publish_queue():
+    global _publish_queue
+    with _publish_queue_lock:
+        if _publish_queue is None:
+            _publish_queue = PublishQueue()
+            _publish_queue.start()
+    return _publish_queue
+
+
+def start_async_publish_queue():
+    """Makes an AsyncPublishQueue on the running event loop the publish queue, for the async app"""
+    global _publish_queue
+    with _publish_queue_lock:
+        if _publish_queue is None:
+            _publish_queue = AsyncPublishQueue()
+            _publish_queue.start()
+    return _publish_queue
@@ -1,59 +1,79 @@
 import os
+import threading
+
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
-from thefuzz import fuzz
-from unidecode import unidecode
-import pwd
-
 from utils.log import get_logger
-from utils.utils import cache_for_n_seconds
+from utils.metrics import Histogram, SLACK_API_ERRORS, SLACK_API_SECONDS
+from utils.passwd import get_passwd_index
+from utils.persist import register_state
+from utils.cache import cache_for_n_seconds
 
 logger = get_logger(__name__)
 
+SLACK2UNIX_SECONDS = Histogram("susbot_slack2unix_seconds", "Time spent updating the slack id -> unix user map", ["users"])
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
 
+def _get_matcher():
+    """The IdentityMatcher, created on first use: utils.matcher pulls in numpy, rapidfuzz and unidecode"""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                from utils.matcher import IdentityMatcher
+                _matcher = IdentityMatcher()
+    return _matcher
+
+
+@cache_for_n_seconds(seconds=24 * 60 * 60, negative_seconds=60, stale_while_revalidate=True)
 def get_slack_users():
     client = WebClient(token=os.environ.get("SLACK_BOT_TOKEN"))
 
     try:
         # Call the users.list method using the WebClient
         # users.list requires the users:read scope
-        result = client.users_list()["members"]
+        with SLACK_API_SECONDS.labels("users.list").time():
+            result = client.users_list()["members"]
         return result
 
     except SlackApiError as e:
+        SLACK_API_ERRORS.labels("users.list", e.response.get("error") or str(e.response.status_code)).inc()
         logger.error("Error creating conversation: {}".format(e))
         return []
+    except OSError as e:  # URLError, timeouts: Slack not reachable (yet), retried after `negative_seconds`
+        SLACK_API_ERRORS.labels("users.list", "network").inc()
+        logger.error(f"Failed to list Slack users: {e}")
+        return []
 
 
-@cache_for_n_seconds(seconds=24 * 60 * 60)
 def get_slack2unix_map():
-    slack2unix_map = {}
-    slack2unix_map_score = {}
-    slack_users = get_slack_users()
-    for linux_user in pwd.getpwall():
-        if linux_user.pw_uid < 100 or linux_user.pw_name.startswith('.'):
-            continue
-        dic = {}
-        for slack_user in slack_users:
-            if slack_user['id'] == 'U01UCDZ1RT3':
-                continue
-            if 'real_name' in slack_user:
-                slack = unidecode(slack_user['real_name'].lower())
-                linux = unidecode(linux_user.pw_gecos.lower())
-                linux_fn = linux.rpartition(' ')[0]
-                linux_sn = linux.rpartition(' ')[-1]
-                slack_fn = slack.rpartition(' ')[0]
-                slack_sn = slack.rpartition(' ')[-1]
-                score = fuzz.partial_ratio(linux, slack)
-                score += fuzz.partial_ratio(linux_fn, slack_fn) / 4
-                score += fuzz.partial_ratio(linux_sn, slack_sn) / 10
-                dic.update({slack_user['real_name']: (slack_user['id'], score)})
-        if len(dic) > 0:
-            match_ = sorted(dic.items(), key=lambda x: -x[1][1])[0]
-            if match_[1][1] > 75:
-                match = match_
-                if match[1][0] not in slack2unix_map_score or (match[1][0] in slack2unix_map_score and slack2unix_map_score[match[1][0]] < match[1][1]):
-                    slack2unix_map_score.update({match[1][0]: match[1][1]})
-                    slack2unix_map.update({match[1][0]: linux_user.pw_name})
-    return slack2unix_map
+    """
+    slack id -> unix user name, see IdentityMatcher for the matching rules.
+    The Slack user list is refreshed daily in the background, passwd changes are picked up through the passwd index,
+    only the users that changed are matched again.
+    """
+    matcher = _get_matcher()
+    with SLACK2UNIX_SECONDS.labels("linux").time():
+        matcher.set_linux_users(get_passwd_index().entries())
+    if slack_users := get_slack_users():  # keep the current map if users.list failed
+        with SLACK2UNIX_SECONDS.labels("slack").time():
+            matcher.set_slack_users(slack_users)
+    return matcher.mapping()
+
+
+def update_slack_user(user):
+    """Applies a single Slack user change (`user_change`/`team_join` events) to the map without a full rebuild."""
+    return _get_matcher().update_slack_user(user)
+
+
+def _import_state(state):
+    _get_matcher().import_state(state)
+    # served right away and refreshed in the background on first use
+    get_slack_users.cache.put([{"id": slack_id, "real_name": real_name} for slack_id, real_name in state["slack"]], expires_at=0)
+
+
+register_state("slack2unix", lambda: _matcher.export_state() if _matcher is not None else None, _import_state)
@@ -0,0 +1,47 @@
+import contextlib
+import time
+
+from utils.log import get_logger
+from utils.metrics import register_collector
+
+logger = get_logger(__name__)
+
+
+class StartupTimer:
+    """
+    Wall time of the startup phases, from `started_at` (a `time.perf_counter()` taken before the imports).
+    Logged when `done()` is called and served as `susbot_startup_phase_seconds`.
+    """
+
+    def __init__(self, started_at=None):
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.phases = {}  # phase -> seconds, in the order they finished
+
+    def mark(self, name):
+        """Records `name` as the time from `started_at` until now, e.g. for the imports."""
+        self.phases[name] = time.perf_counter() - self.started_at
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+            logger.debug(f"Startup phase {name} took {self.phases[name]:.3f}s", extra={"phase": name, "seconds": round(self.phases[name], 4)})
+
+    def done(self, name):
+        """Records `name` as the time since `started_at` and logs every phase so far."""
+        self.mark(name)
+        logger.info(f"Startup: {', '.join(f'{phase} {seconds:.2f}s' for phase, seconds in list(self.phases.items()))}",
+                    extra={"phases": {phase: round(seconds, 4) for phase, seconds in list(self.phases.items())}})
+
+    def collect(self):
+        return [("susbot_startup_phase_seconds", "gauge", "Duration of the startup phases, the ones marked with `mark`/`done` (imports, ready, warm) since the process started",
+                 [({"phase": phase}, seconds) for phase, seconds in list(self.phases.items())])]
+
+
+def start_timer(started_at=None):
+    timer = StartupTimer(started_at)
+    register_collector(timer.collect)
+    return timer
@@ -0,0 +1,114 @@
+MAX_TEXT_LENGTH = 3000  # Slack's limit on a text object, e.g. the mrkdwn element of a context block
+CODE_FENCE = "```"
+
+
+def _cut(text, size):
+    """`text` cut to at most `size` bytes, ending with "…" if it was cut"""
+    if len(text.encode()) <= size:
+        return text
+    return text.encode()[:size - len("…".encode())].decode(errors="ignore") + "…"
+
+
+class Table:
+    """
+    Plain text table rendered into Slack code blocks.
+
+    Cells are turned into strings once, in `add_row`, and the column widths are kept up to date as rows come in,
+    so rendering is a single pass over the rows with one precompiled format string. Columns without a single
+    non-empty cell are left out. `chunks()` packs the lines into code blocks of at most `limit` bytes, fences and
+    the repeated header included, so every chunk fits in one Slack text object.
+    """
+
+    def __init__(self, columns, align=None, sep="  ", header=True):
+        """`columns`: column titles, `align`: "<" or ">" per column, right aligned by default"""
+        self.titles = list(columns)
+        self.align = list(align) if align is not None else [">"] * len(self.titles)
+        self.sep = sep
+        self.header = header
+        self.rows = []  # lists of cells, or a str printed as is (separator lines)
+        self.widths = [len(title) if header else 0 for title in self.titles]
+        self.filled = [False] * len(self.titles)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add_row(self, values):
+        cells = ["" if value is None else str(value) for value in values]
+        widths, filled = self.widths, self.filled
+        for i, cell in enumerate(cells):
+            if cell:
+                filled[i] = True
+                if len(cell) > widths[i]:
+                    widths[i] = len(cell)
+        self.rows.append(cells)
+
+    def add_separator(self, line="---"):
+        self.rows.append(line)
+
+    def _format(self):
+        keep = [i for i, filled in enumerate(self.filled) if filled]
+        return self.sep.join(f"{{{i}:{self.align[i]}{self.widths[i]}}}" for i in keep).format
+
+    def header_line(self):
+        return self._format()(*self.titles) if self.header else None
+
+    def lines(self):
+        fmt = self._format()
+        return [row if isinstance(row, str) else fmt(*row) for row in self.rows]
+
+    def chunks(self, limit=MAX_TEXT_LENGTH, max_chunks=None):
+        """
+        The table as code blocks of at most `limit` bytes each, the header repeated at the top of every one.
+        With `max_chunks`, the lines that do not fit are dropped and counted in a note at the end of the last chunk.
+        """
+        header = self.header_line()
+        if header is not None and len(header.encode()) + 1 > (limit - 2 * len(CODE_FENCE)) // 2:  # leave room for the lines
+            header = _cut(header, (limit - 2 * len(CODE_FENCE)) // 2 - 1)
+        overhead = 2 * len(CODE_FENCE) + (len(header.encode()) + 1 if header is not None else 0)
+        chunks, current, size = [], [], overhead
+        for line in self.lines():
+            length = len(line.encode()) + 1
+            if length + overhead > limit:  # a single line longer than a text object
+                line = _cut(line, limit - overhead - 1)
+                length = len(line.encode()) + 1
+            if current and size + length > limit:
+                chunks.append(current)
+                current, size = [], overhead
+            current.append(line)
+            size += length
+        if current:
+            chunks.append(current)
+
+        if max_chunks is not None and len(chunks) > max_chunks:
+            dropped = sum(len(chunk) for chunk in chunks[max_chunks:])
+            chunks, last = chunks[:max_chunks], chunks[max_chunks - 1]
+            while True:
+                note = f"… {dropped} more lines"
+                if overhead + sum(len(line.encode()) + 1 for line in last) + len(note.encode()) + 1 <= limit or not last:
+                    break
+                last.pop()
+                dropped += 1
+            last.append(note)
+        return [CODE_FENCE + "\n".join(([header] if header is not None else []) + chunk) + CODE_FENCE for chunk in chunks]
+
+
+def align_widths(tables):
+    """Gives tables with the same columns the same column widths, e.g. one table per gpu type shown one above the other"""
+    tables = list(tables)
+    if not tables:
+        return
+    widths = [max(widths) for widths in zip(*(table.widths for table in tables))]
+    filled = [any(filled) for filled in zip(*(table.filled for table in tables))]
+    for table in tables:
+        table.widths, table.filled = list(widths), list(filled)
+
+
+def context_blocks(texts):
+    """One context block per mrkdwn text, e.g. per chunk of a table"""
+    return [{
+        "type": "context",
+        "elements": [{
+            "type": "mrkdwn",
+            "text": text,
+        }],
+    } for text in texts]